@@ -2,23 +2,60 @@
 
 from collections import defaultdict
 import itertools
+import multiprocessing
 
-from joblib import Parallel, delayed
+import numpy as np
+
+import eclat as ecl
+import fpgrowth as fpg
+from frequent_itemsets import FrequentItemsetTable
+from parallel import shard_bounds
 
 
 NUM_CORES = 1
 
-# TODO:
-#   - use Numpy arrays where possible
-#   - after that, another try at multiprocessing
+ENGINES = ('apriori', 'bitset', 'fpgrowth', 'eclat')
+
+# Number of set bits in each byte value, used to popcount bitmaps
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+# How many candidates to AND together at once in the bitset engine
+_BITSET_BATCH = 4096
+
+
+def deduplicate_transactions(transactions):
+    """
+    Collapse identical transactions into unique transactions and their multiplicities
+
+    :param transactions: list of iterables
+    :return: list of unique transactions (sorted tuples), list of weights
+
+    >>> deduplicate_transactions([('B', 'A'), ('C',), ('A', 'B', 'A')])
+    ([('A', 'B'), ('C',)], [2, 1])
+    """
+    weights = {}
+    unique = []
+    for transaction in transactions:
+        transaction = tuple(sorted(set(transaction)))
+        if transaction not in weights:
+            weights[transaction] = 0
+            unique.append(transaction)
+        weights[transaction] += 1
+
+    return unique, [weights[transaction] for transaction in unique]
+
+
+def _total_weight(transactions, weights):
+    return len(transactions) if weights is None else sum(weights)
 
 
-def support_count(itemset, transactions):
+def support_count(itemset, transactions, weights=None):
     """
     Count support count for itemset
 
     :param itemset: items to measure support count for
     :param transactions: list of sets (all transactions)
+    :param weights: multiplicities of transactions, see deduplicate_transactions
 
     >>> simple_transactions = ['ABC', 'BC', 'BD', 'D']
     >>> [support_count(item, simple_transactions) for item in 'ABCDE']
@@ -26,12 +63,17 @@ def support_count(itemset, transactions):
     >>> some_transactions = [set(['beer', 'bread', 'milk']), set(['beer']), set(['milk'])]
     >>> support_count(set(['beer']), some_transactions)
     2
+    >>> support_count(set(['beer']), some_transactions, weights=[3, 1, 5])
+    4
     """
+    if weights is not None:
+        return sum(weight for row, weight in zip(transactions, weights) if set(itemset) <= set(row))
+
     return len([row for row in transactions if set(itemset) <= set(row)])
 
 
-def get_support(itemset, transactions):
-    return support_count(itemset, transactions) / float(len(transactions))
+def get_support(itemset, transactions, weights=None):
+    return support_count(itemset, transactions, weights) / float(_total_weight(transactions, weights))
 
 
 def _apriori_gen(frequent_sets):
@@ -71,15 +113,115 @@ def _apriori_gen(frequent_sets):
     return new_candidates
 
 
-def _apriori_prune(candidates, transactions, k, frequent_itemsets, minsup):
+def _build_candidate_trie(candidates):
+    """
+    Build a prefix trie of sorted candidate itemsets
+
+    Inner nodes are dicts keyed by item, the last level maps the final item of each candidate to the candidate itself.
+
+    >>> _build_candidate_trie([('A', 'B'), ('A', 'C'), ('B', 'C')])
+    {'A': {'B': ('A', 'B'), 'C': ('A', 'C')}, 'B': {'C': ('B', 'C')}}
+    """
+    trie = {}
+    for cand in candidates:
+        node = trie
+        for item in cand[:-1]:
+            node = node.setdefault(item, {})
+        node[cand[-1]] = cand
+
+    return trie
+
+
+def _count_trie(node, items, start, depth, support, weight=1):
+    """
+    Increment support of every candidate in the trie contained in sorted transaction items
+
+    :param node: trie node
+    :param items: sorted items of a transaction
+    :param start: index of first item in items to consider
+    :param depth: number of items still needed to reach a candidate from this node
+    :param support: dict to increment supports in
+    :param weight: multiplicity of the transaction
+
+    >>> support = defaultdict(int)
+    >>> _count_trie(_build_candidate_trie([('A', 'B'), ('A', 'C'), ('B', 'C')]), ['A', 'B', 'D'], 0, 2, support)
+    >>> dict(support)
+    {('A', 'B'): 1}
+    """
+    if depth == 1:
+        for item in items[start:]:
+            cand = node.get(item)
+            if cand is not None:
+                support[cand] += weight
+        return
+
+    for i in range(start, len(items) - depth + 1):
+        child = node.get(items[i])
+        if child is not None:
+            _count_trie(child, items, i + 1, depth - 1, support, weight)
+
+
+def _count_candidates(candidates, transactions, k, support, weights=None):
+    """
+    Count support of length k candidates in transactions
+
+    :param candidates: candidate itemsets
+    :param transactions: list of iterables
+    :param k: length of candidates
+    :param support: dict to increment supports in
+    :param weights: multiplicities of transactions
+    """
+    trie = _build_candidate_trie(candidates)
+    candidate_items = set(item for cand in candidates for item in cand)
+
+    if weights is None:
+        weights = itertools.repeat(1)
+
+    for t, weight in zip(transactions, weights):
+        items = sorted(candidate_items.intersection(t))
+        if len(items) >= k:
+            _count_trie(trie, items, 0, k, support, weight)
+
+
+_worker_transactions = None
+_worker_weights = None
+
+
+def _init_worker(transactions, weights):
+    """Keep the transactions and their weights in a pool worker, for _count_shard to slice by shard bounds"""
+    global _worker_transactions, _worker_weights
+    _worker_transactions = transactions
+    _worker_weights = weights
+
+
+def _count_shard(args):
+    """Count support of candidates in a slice of the worker's transactions"""
+    candidates, k, start, end = args
+    support = defaultdict(int)
+    weights = _worker_weights[start:end] if _worker_weights is not None else None
+    _count_candidates(candidates, _worker_transactions[start:end], k, support, weights)
+    return dict(support)
+
+
+def _apriori_prune(candidates, transactions, k, frequent_itemsets, minsup, pool=None, support=None, weights=None):
     """
     Prune candidate itemsets
 
+    Candidates with an infrequent (k-1)-subset are dropped first, the rest are counted by pushing each transaction once
+    through a prefix trie of the candidates.
+
     :param candidates: candidate itemsets
     :param transactions:
     :param k:
     :param frequent_itemsets: list of lists of frequent itemsets grouped by k
     :param minsup: minimum support
+    :param pool: process pool initialized with the transactions, to count shards of transactions in parallel
+    :param support: dict to store support counts of candidates in
+    :param weights: multiplicities of transactions
+
+    >>> freq = [[], [('A',), ('B',), ('C',)], [('A', 'B'), ('A', 'C'), ('B', 'C')]]
+    >>> _apriori_prune([('A', 'B', 'C')], ['ABC', 'AB', 'ABC', 'C'], 3, freq, 0.5)
+    [('A', 'B', 'C')]
     """
 
     # Validate some inputs
@@ -89,25 +231,141 @@ def _apriori_prune(candidates, transactions, k, frequent_itemsets, minsup):
     errors = [cand for cand in candidates if sorted(list(set(cand))) != sorted(list(cand))]
     assert not errors, errors
 
-    N = len(transactions)
+    N = _total_weight(transactions, weights)
 
-    pruned_candidates = candidates
-    support = defaultdict(int)
+    pruned_candidates = _subset_prune(candidates, frequent_itemsets, k)
+    if support is None:
+        support = defaultdict(int)
 
-    for t in transactions:
-        candidate_sets = pruned_candidates  # Remove the already pruned ones
-        for candset in candidate_sets:
-            subsets = generate_transaction_subsets(candset, k - 1)
-            for subset in subsets:
-                if subset not in frequent_itemsets[len(subset)]:
-                    # This candidate is not frequent
-                    pruned_candidates.remove(candset)
-                    break
-            else:
-                if all(candidate in t for candidate in candset):
-                    support[candset] += 1
+    if pool is None:
+        _count_candidates(pruned_candidates, transactions, k, support, weights)
+    else:
+        tasks = [(pruned_candidates, k, start, end) for start, end in shard_bounds(len(transactions), NUM_CORES)]
+        for partial_support in pool.map(_count_shard, tasks):
+            for cand, count in partial_support.items():
+                support[cand] += count
+
+    pruned_candidates = [item for item in pruned_candidates if support[item] >= max(N * minsup, 1)]
 
-    pruned_candidates = [item for item in pruned_candidates if support[item] >= N * minsup]
+    return pruned_candidates
+
+
+def _subset_prune(candidates, frequent_itemsets, k):
+    """
+    Drop candidates which have an infrequent (k-1)-subset
+
+    >>> _subset_prune([('A', 'B', 'C'), ('A', 'B', 'D')], [[], [], [('A', 'B'), ('A', 'C'), ('B', 'C'), ('A', 'D')]], 3)
+    [('A', 'B', 'C')]
+    """
+    previous = set(frequent_itemsets[k - 1])
+    return [cand for cand in candidates
+            if all(subset in previous for subset in generate_transaction_subsets(cand, k - 1))]
+
+
+def _build_item_bitmaps(transactions, all_items, weights=None):
+    """
+    Build a packed bitmap for each item, one bit per transaction
+
+    With weights, transactions of equal weight are placed in their own run of words, so that every word has a single
+    weight.
+
+    :param transactions: list of iterables
+    :param all_items: list of distinct items
+    :param weights: multiplicities of transactions
+    :return: dict mapping items to row numbers, 2D array of uint64 words (one row per item), array of word weights
+             (None without weights)
+
+    >>> index, bitmaps, word_weights = _build_item_bitmaps(['AB', 'B', 'BC'], 'ABC')
+    >>> [_popcount(bitmaps[index[item]]) for item in 'ABC']
+    [1, 3, 1]
+    >>> index, bitmaps, word_weights = _build_item_bitmaps(['AB', 'B', 'BC'], 'ABC', weights=[2, 1, 2])
+    >>> [_popcount(bitmaps[index[item]], word_weights) for item in 'ABC']
+    [2, 5, 2]
+    """
+    index = dict((item, row) for row, item in enumerate(all_items))
+
+    if weights is None:
+        positions = list(range(len(transactions)))
+        n_words = (len(transactions) + 63) // 64
+        word_weights = None
+    else:
+        positions = [0] * len(transactions)
+        word_weights = []
+        position = 0
+        for tid in sorted(range(len(transactions)), key=lambda tid: weights[tid]):
+            if position % 64 == 0 or word_weights[-1] != weights[tid]:
+                position = 64 * len(word_weights)
+                word_weights.append(weights[tid])
+            positions[tid] = position
+            position += 1
+        n_words = len(word_weights)
+        word_weights = np.array(word_weights, dtype=np.int64)
+
+    rows = []
+    columns = []
+    for tid, transaction in enumerate(transactions):
+        for item in set(transaction):
+            if item in index:
+                rows.append(index[item])
+                columns.append(positions[tid])
+
+    matrix = np.zeros((len(index), n_words * 64), dtype=bool)
+    matrix[rows, columns] = True
+
+    return index, np.packbits(matrix, axis=1).view(np.uint64), word_weights
+
+
+def _popcount(words, word_weights=None):
+    """
+    Count set bits in an array of words, summing over the last axis
+
+    :param words: array of uint64 words
+    :param word_weights: weight of each bit in a word, for each word along the last axis
+
+    >>> _popcount(np.array([1, 3, 255], dtype=np.uint64))
+    11
+    >>> _popcount(np.array([1, 3, 255], dtype=np.uint64), np.array([1, 2, 3]))
+    29
+    """
+    if word_weights is None:
+        counts = _POPCOUNT[words.view(np.uint8)].sum(axis=-1)
+    else:
+        byte_counts = _POPCOUNT[words.view(np.uint8)].reshape(words.shape + (8,))
+        counts = (byte_counts.sum(axis=-1) * word_weights).sum(axis=-1)
+
+    return int(counts) if np.ndim(counts) == 0 else counts
+
+
+def _bitset_prune(candidates, item_index, bitmaps, k, frequent_itemsets, minsup, N, support=None, word_weights=None):
+    """
+    Prune candidate itemsets using per-item bitmaps for support counting
+
+    :param candidates: candidate itemsets
+    :param item_index: dict mapping items to bitmap rows
+    :param bitmaps: 2D array of packed transaction bitmaps, one row per item
+    :param k: length of candidates
+    :param frequent_itemsets: list of lists of frequent itemsets grouped by k
+    :param minsup: minimum support
+    :param N: number of transactions
+    :param support: dict to store support counts of frequent candidates in
+    :param word_weights: weights of bitmap words, for weighted transactions
+    """
+    candidates = _subset_prune(candidates, frequent_itemsets, k)
+    pruned_candidates = []
+
+    for start in range(0, len(candidates), _BITSET_BATCH):
+        batch = candidates[start:start + _BITSET_BATCH]
+        rows = np.array([[item_index[item] for item in cand] for cand in batch], dtype=np.intp)
+
+        words = bitmaps[rows[:, 0]]
+        for column in range(1, k):
+            words &= bitmaps[rows[:, column]]
+
+        for cand, count in zip(batch, _popcount(words, word_weights)):
+            if count >= max(N * minsup, 1):
+                pruned_candidates.append(cand)
+                if support is not None:
+                    support[cand] = int(count)
 
     return pruned_candidates
 
@@ -149,13 +407,24 @@ def generate_transaction_subsets(transaction, k):
     return subsets
 
 
-def apriori(transactions, all_items, minsup, fixed_k=None, verbose=False):
+def apriori(transactions, all_items, minsup, fixed_k=None, verbose=False, engine='apriori', as_table=False,
+            closed=False, maximal=False, weights=None):
     """
     Apriori method
 
+    With engine 'apriori' and NUM_CORES > 1, candidates are counted in a process pool, each process counting a shard
+    of the transactions.
+
     :param transactions: list of iterables (list of transactions containing items)
     :param all_items: list distinct items
-    :param minsup: minimum support
+    :param minsup: minimum support, itemsets not in any transaction are never frequent (also with minsup 0 or no
+                   transactions) so that all engines find the same itemsets
+    :param engine: 'apriori' (scan transactions), 'bitset' (AND + popcount of item bitmaps), 'fpgrowth' (FP-tree,
+                   no candidate generation) or 'eclat' (depth-first over tidsets / diffsets)
+    :param as_table: return a FrequentItemsetTable with support counts instead of a list of itemsets
+    :param closed: return only closed frequent itemsets, mined with CHARM regardless of engine
+    :param maximal: return only maximal frequent itemsets, mined depth-first regardless of engine
+    :param weights: multiplicities of transactions, see deduplicate_transactions
 
     >>> simple_transactions = [('007', '666', '777'), ('007', 'BC',), ('007', '666'), ('777',)]
     >>> alphabet = ['007', '666', '777', 'BC']
@@ -169,44 +438,116 @@ def apriori(transactions, all_items, minsup, fixed_k=None, verbose=False):
     [('007',)]
     >>> apriori(simple_transactions, alphabet, 0.9)
     []
+    >>> apriori(simple_transactions, alphabet, 0.3, engine='bitset')
+    [('007',), ('666',), ('777',), ('007', '666')]
+    >>> apriori(simple_transactions, alphabet, 0.3, engine='fpgrowth')
+    [('007',), ('666',), ('777',), ('007', '666')]
+    >>> apriori(simple_transactions, alphabet, 0.3, engine='eclat')
+    [('007',), ('666',), ('777',), ('007', '666')]
+    >>> [apriori([], alphabet, 0.3, engine=engine) for engine in ENGINES]
+    [[], [], [], []]
+    >>> len(apriori(simple_transactions, alphabet, 0))
+    9
+    >>> [apriori(simple_transactions, alphabet, 0, engine=engine) == apriori(simple_transactions, alphabet, 0)
+    ...  for engine in ENGINES]
+    [True, True, True, True]
+    >>> apriori(simple_transactions, alphabet, 0.3, as_table=True).support_count(('007', '666'))
+    2
+    >>> apriori(simple_transactions, alphabet, 0.3, closed=True)
+    [('007',), ('777',), ('007', '666')]
+    >>> apriori(simple_transactions, alphabet, 0.3, maximal=True)
+    [('777',), ('007', '666')]
+    >>> unique, weights = deduplicate_transactions(simple_transactions + simple_transactions[:1])
+    >>> apriori(unique, alphabet, 0.4, weights=weights)
+    [('007',), ('666',), ('777',), ('007', '666'), ('007', '777'), ('666', '777'), ('007', '666', '777')]
     """
 
+    if engine not in ENGINES:
+        raise ValueError('Unknown engine %s, expected one of %s' % (engine, ', '.join(ENGINES)))
+
+    if closed and maximal:
+        raise ValueError('Only one of closed and maximal can be given')
+
+    if closed or maximal or engine in ('fpgrowth', 'eclat'):
+        if closed or maximal:
+            miner = ecl.closed_support if closed else ecl.maximal_support
+            support = miner(transactions, all_items, minsup, verbose=verbose, weights=weights)
+        else:
+            miner = fpg.fpgrowth_support if engine == 'fpgrowth' else ecl.eclat_support
+            support = miner(transactions, all_items, minsup, fixed_k=fixed_k, verbose=verbose, weights=weights)
+        if fixed_k:
+            support = dict((itemset, count) for itemset, count in support.items() if len(itemset) == fixed_k)
+
+        table = FrequentItemsetTable(support, _total_weight(transactions, weights), closed=closed, maximal=maximal)
+        return table if as_table else table.itemsets()
+
     all_items = sorted(list(all_items))
 
     k = 1
-    N = len(transactions)
+    N = _total_weight(transactions, weights)
 
     frequent_itemsets = [[], []]  # k index, zero always empty
     support = defaultdict(int)
     transaction_subsets = dict()
 
+    if engine == 'bitset':
+        item_index, bitmaps, word_weights = _build_item_bitmaps(transactions, all_items, weights)
+    else:
+        item_counts = defaultdict(int)
+        for t, weight in zip(transactions, weights if weights is not None else itertools.repeat(1)):
+            for item in set(t):
+                item_counts[item] += weight
+
     for item in all_items:
         new_item = (item,)
-        support[new_item] = support_count(new_item, transactions)
+        if engine == 'bitset':
+            support[new_item] = _popcount(bitmaps[item_index[item]], word_weights)
+        else:
+            support[new_item] = item_counts[item]
 
-        if support[new_item] >= N * minsup:
+        if support[new_item] >= max(N * minsup, 1):
             frequent_itemsets[1].append(new_item)
 
+    pool = None
+    if engine == 'apriori' and NUM_CORES > 1:
+        pool = multiprocessing.Pool(NUM_CORES, initializer=_init_worker, initargs=(transactions, weights))
+
     pruned_candidates = [True, 'dummy']
 
-    while pruned_candidates and len(pruned_candidates) > 1 and (not fixed_k or k < fixed_k):
-        k += 1
-        candidates = _apriori_gen(frequent_itemsets[k - 1])
-        pruned_candidates = _apriori_prune(candidates, transactions, k, frequent_itemsets, minsup)
-        if verbose:
-            print('k=%s - candidate itemsets: %s - pruned itemsets: %s' % (k, len(candidates), len(pruned_candidates)))
-        if not pruned_candidates:
-            break
+    try:
+        while pruned_candidates and len(pruned_candidates) > 1 and (not fixed_k or k < fixed_k):
+            k += 1
+            candidates = _apriori_gen(frequent_itemsets[k - 1])
+            if engine == 'bitset':
+                pruned_candidates = _bitset_prune(candidates, item_index, bitmaps, k, frequent_itemsets, minsup, N,
+                                                  support=support, word_weights=word_weights)
+            else:
+                pruned_candidates = _apriori_prune(candidates, transactions, k, frequent_itemsets, minsup, pool=pool,
+                                                   support=support, weights=weights)
+            if verbose:
+                print('k=%s - candidate itemsets: %s - pruned itemsets: %s' %
+                      (k, len(candidates), len(pruned_candidates)))
+            if not pruned_candidates:
+                break
 
-        frequent_itemsets.append(pruned_candidates)
+            frequent_itemsets.append(pruned_candidates)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
     if fixed_k:
         try:
-            return frequent_itemsets[fixed_k]
+            frequent = frequent_itemsets[fixed_k]
         except IndexError:
-            return []
+            frequent = []
+    else:
+        frequent = list(itertools.chain(*frequent_itemsets))
+
+    if as_table:
+        return FrequentItemsetTable(dict((itemset, support[itemset]) for itemset in frequent), N)
 
-    return list(itertools.chain(*frequent_itemsets))
+    return frequent
 
 
 if __name__ == "__main__":
@@ -2,14 +2,28 @@
 
 Model sequences like ((1, 2, 3), (4, 5), (4, 6)).
 
-To get course sequences with empty elements as (0,):
-course_seqs = [x.course_sequence for x in s.students]
-course_seqs2 = [tuple([seq or (0,) for seq in x.course_sequence]) for x in s.students]
+Empty elements need no padding: they only count as time for the gap and window constraints. Sequences with many
+empty elements, like daily observations, can be given as sparse_sequence.SparseSequence, which stores only the
+non-empty elements with their positions:
+year_seqs = [SparseSequence.from_elements(seq) for seq in year_seqs]
 """
 
+from bisect import bisect_left
 from collections import defaultdict
 from pprint import pprint
-import copy
+import multiprocessing
+
+from parallel import shard_bounds
+import prefixspan
+import spade
+from sparse_sequence import SparseSequence, day_elements
+
+
+NUM_CORES = 1
+
+ENGINES = ('apriori', 'spade', 'prefixspan')
+
+_BATCHES_PER_CORE = 4
 
 
 def flatten(sequence):
@@ -17,6 +31,134 @@ def flatten(sequence):
     return [event for element in sequence for event in element]
 
 
+def position_index(sequence):
+    """
+    Get positions of events in a sequence, for fast containment checks of many patterns
+
+    :param sequence: sequence containing elements containing events, or a SparseSequence
+    :return: dict of event -> sorted list of positions of elements containing the event
+
+    >>> sorted(position_index(((2, 4), (), (2, 5))).items())
+    [(2, [0, 2]), (4, [0]), (5, [2])]
+    >>> position_index(SparseSequence.from_elements(((2, 4), (), (2, 5)))) == position_index(((2, 4), (), (2, 5)))
+    True
+    """
+    index = defaultdict(list)
+    for position, element in day_elements(sequence):
+        for event in set(element):
+            index[event].append(position)
+
+    return dict(index)
+
+
+def _next_position(element, index, start):
+    """
+    Find the first position at or after start of an element containing all events of element, None if there is none
+
+    >>> _next_position((2, 5), {2: [0, 1, 4], 5: [1, 3, 4]}, 2)
+    4
+    """
+    position = start
+    while True:
+        for event in element:
+            positions = index.get(event)
+            if not positions:
+                return None
+            next_index = bisect_left(positions, position)
+            if next_index == len(positions):
+                return None
+            if positions[next_index] > position:
+                # Some event is missing from this element, jump to the next element having it
+                position = positions[next_index]
+                break
+        else:
+            return position
+
+
+def _element_windows(element, index, start):
+    """
+    Generate occurrences of element as (first, last) positions of its events, by increasing first position at or
+    after start, each with the earliest possible last position
+
+    >>> list(_element_windows((2, 5), {2: [0, 3, 4], 5: [1, 4]}, 0))
+    [(0, 1), (1, 3), (3, 4), (4, 4)]
+    """
+    while True:
+        positions = []
+        for event in element:
+            event_positions = index.get(event)
+            if not event_positions:
+                return
+            next_index = bisect_left(event_positions, start)
+            if next_index == len(event_positions):
+                return
+            positions.append(event_positions[next_index])
+
+        first = min(positions)
+        yield first, max(positions)
+        start = first + 1
+
+
+def _contains_constrained(sequence, index, i, previous_first, previous_last, min_gap, max_gap, window_size, failed):
+    """
+    Check if elements i... of sequence occur after an occurrence of element i - 1, backtracking over occurrences
+
+    :param failed: set of (i, previous_first, previous_last) known not to lead to an occurrence
+    """
+    if i == len(sequence):
+        return True
+    if (i, previous_first, previous_last) in failed:
+        return False
+
+    start = previous_last + min_gap + 1 if i else 0
+    for first, last in _element_windows(sequence[i], index, start):
+        if i and max_gap is not None and last - previous_first > max_gap:
+            # Later occurrences end even later
+            break
+        if last - first <= window_size and _contains_constrained(sequence, index, i + 1, first, last, min_gap,
+                                                                 max_gap, window_size, failed):
+            return True
+
+    failed.add((i, previous_first, previous_last))
+    return False
+
+
+def contains(sequence, index, min_gap=None, max_gap=None, window_size=None):
+    """
+    Check if sequence is a subsequence of the sequence of a position index
+
+    Time constraints follow GSP, with the position of an element as its time: the events of a pattern element may be
+    spread over elements at most window_size apart, and the first position of each pattern element must be more than
+    min_gap after the last position of the previous one, its last position at most max_gap after the first position of
+    the previous one.
+
+    :param sequence: pattern (sequence containing elements containing events)
+    :param index: position index of a sequence, see position_index
+    :param min_gap: minimum gap between consecutive pattern elements, None for 0 (any later element)
+    :param max_gap: maximum gap between consecutive pattern elements, None for no limit
+    :param window_size: maximum time span of a pattern element, None for 0 (events in one element)
+
+    >>> index = position_index(((2, 4), (3, 5, 6), (8,)))
+    >>> contains(((2,), (3, 5)), index), contains(((1,), (2,)), position_index(((1, 2), (3, 4))))
+    (True, False)
+    >>> contains(((2,), (8,)), index, max_gap=1), contains(((2,), (8,)), index, max_gap=2)
+    (False, True)
+    >>> contains(((2,), (3,)), index, min_gap=1), contains(((2, 8),), index, window_size=2)
+    (False, True)
+    """
+    if min_gap is None and max_gap is None and window_size is None:
+        position = 0
+        for element in sequence:
+            position = _next_position(element, index, position)
+            if position is None:
+                return False
+            position += 1
+
+        return True
+
+    return _contains_constrained(sequence, index, 0, None, None, min_gap or 0, max_gap, window_size or 0, set())
+
+
 def is_subsequence(seq1, seq2):
     """Check if seq1 is a subsequence of seq2
 
@@ -27,26 +169,57 @@ def is_subsequence(seq1, seq2):
     >>> is_subsequence(((2,), (4,)), ((2, 4), (2, 4), (2, 5)))
     True
     """
-    seq = copy.deepcopy(seq1)
-    for element in seq2:
-        if seq and set(seq[0]) <= set(element):
-            seq = seq[1:]
+    return contains(seq1, position_index(seq2))
 
-    return True if not seq else False
 
+def deduplicate_sequences(sequences):
+    """
+    Collapse identical sequences into unique sequences and their multiplicities
 
-def support_count(sequence, seq_list):
+    :param sequences: list of sequences containing elements containing events, or SparseSequences
+    :return: list of unique sequences (tuples of tuples or SparseSequences), list of weights
+
+    >>> deduplicate_sequences([((1,), (2,)), ((2,),), [[1], [2]]])
+    ([((1,), (2,)), ((2,),)], [2, 1])
+    >>> deduplicate_sequences([SparseSequence.from_elements(((1,), (), (2,)))] * 2)[1]
+    [2]
+    """
+    weights = {}
+    unique = []
+    for sequence in sequences:
+        if not isinstance(sequence, SparseSequence):
+            sequence = tuple(tuple(element) for element in sequence)
+        if sequence not in weights:
+            weights[sequence] = 0
+            unique.append(sequence)
+        weights[sequence] += 1
+
+    return unique, [weights[sequence] for sequence in unique]
+
+
+def support_count(sequence, seq_list, weights=None, indexes=None, **constraints):
     """
     Count support count for sequence
 
     :param itemset: items to measure support count for
     :param transactions: list of sets (all transactions)
+    :param weights: multiplicities of sequences, see deduplicate_sequences
+    :param indexes: position indexes of the sequences (see position_index), built from seq_list if None
+    :param constraints: min_gap, max_gap and window_size, see contains
 
     >>> simple_seqs = [((1,), (2, 3)), ((2,), (3,)), ((2, 4,),), ((4,),)]
     >>> [support_count(((item,),), simple_seqs) for item in range(1, 5)]
     [1, 3, 2, 2]
+    >>> support_count(((2,),), simple_seqs, weights=[1, 2, 4, 8])
+    7
     """
-    return len([seq for seq in seq_list if is_subsequence(sequence, seq)])
+    if indexes is None:
+        indexes = [position_index(seq) for seq in seq_list]
+
+    if weights is not None:
+        return sum(weight for index, weight in zip(indexes, weights) if contains(sequence, index, **constraints))
+
+    return len([index for index in indexes if contains(sequence, index, **constraints)])
 
 
 def _sequential_candidate_generation(sequences, k):
@@ -72,7 +245,7 @@ def _sequential_candidate_generation(sequences, k):
     >>> _sequential_candidate_generation([(('A', 'B'),), (('A', 'C'),), (('B',), ('C',))], 3)
     [(('A', 'B'), ('C',))]
     >>> _sequential_candidate_generation([(('A',), ('B',)), (('A', 'C'),), (('B', 'C'),), (('C', 'C'),)], 3)
-    [(('A',), ('B', 'C')), (('A', 'C', 'C'),), (('B', 'C', 'C'),)]
+    [(('A',), ('B', 'C')), (('A', 'C', 'C'),), (('B', 'C', 'C'),), (('C', 'C', 'C'),)]
     >>> pprint(_sequential_candidate_generation([((1,),), ((2,),), ((3,),)], 2))
     [((1,), (1,)),
      ((1,), (2,)),
@@ -88,40 +261,47 @@ def _sequential_candidate_generation(sequences, k):
      ((3,), (3,))]
     >>> _sequential_candidate_generation([((1,), (2,)), ((2,), (3,))], 3)
     [((1,), (2,), (3,))]
+    >>> _sequential_candidate_generation([((1,), (1,))], 3)
+    [((1,), (1,), (1,))]
     """
 
     new_candidates = []
-    for index1, seq1 in enumerate(sequences):
-        for index2, seq2 in enumerate(sequences):
-            if k == 2:
-                # Assume we get 1-sequences like we should
+    if k == 2:
+        # Assume we get 1-sequences like we should
+        for seq1 in sequences:
+            for seq2 in sequences:
                 new_candidates.append((seq1[0], seq2[0],))
                 if seq1[0] < seq2[0]:
                     new_candidates.append(((seq1[0] + seq2[0]),))
-            elif k > 2:
-                seq1_flattened = flatten(seq1)
-                seq2_flattened = flatten(seq2)
-                if index1 == index2:
-                    continue
-                if seq1_flattened[1:] == seq2_flattened[:-1]:
-                    new_sequence = copy.deepcopy(seq1)
-                    if len(seq2[-1]) > 1:
-                        new_sequence = new_sequence[:-1] + (new_sequence[-1] + (seq2_flattened[-1],),)
-                    else:
-                        new_sequence += (seq2[-1],)
-                    new_candidates.append(new_sequence)
+    elif k > 2:
+        # Join seq1 with each seq2 whose events without the last one are the events of seq1 without the first one
+        by_head = defaultdict(list)
+        for seq2 in sequences:
+            by_head[tuple(flatten(seq2)[:-1])].append(seq2)
+
+        for seq1 in sequences:
+            for seq2 in by_head.get(tuple(flatten(seq1)[1:]), ()):
+                if len(seq2[-1]) > 1:
+                    new_candidates.append(seq1[:-1] + (seq1[-1] + (seq2[-1][-1],),))
+                else:
+                    new_candidates.append(seq1 + (seq2[-1],))
 
     return new_candidates
 
 
-def get_subsequences(sequence):
+def get_subsequences(sequence, contiguous=False):
     """
     Get length k-1 subsequences of length k sequence
 
+    A subsequence is contiguous unless it drops a single event element from the middle of the sequence. With a max_gap
+    constraint, only contiguous subsequences of a frequent sequence are necessarily frequent.
+
     >>> get_subsequences((('A', 'B'), ('C',)))
     [(('A', 'B'),), (('A',), ('C',)), (('B',), ('C',))]
     >>> get_subsequences((('A', 'B'), ('C',), ('D', 'E')))
     [(('A', 'B'), ('C',), ('D',)), (('A', 'B'), ('C',), ('E',)), (('A', 'B'), ('D', 'E')), (('A',), ('C',), ('D', 'E')), (('B',), ('C',), ('D', 'E'))]
+    >>> get_subsequences((('A',), ('C',), ('D',)), contiguous=True)
+    [(('A',), ('C',)), (('C',), ('D',))]
 
     :rtype : tuple
     :return:
@@ -133,6 +313,8 @@ def get_subsequences(sequence):
         for j in reversed(list(range(0, len(element)))):
             event = element[j]
             if len(element) == 1:
+                if contiguous and 0 < i < len(sequence) - 1:
+                    continue
                 subseq = sequence[:i] + sequence[(i + 1):]
             else:
                 subseq = list(sequence)
@@ -143,13 +325,127 @@ def get_subsequences(sequence):
     return subseqs
 
 
-def apriori_sequential(sequences, minsup, fixed_k=None, verbose=False):
+def _first_events(sequences):
+    """
+    Get distinct events in order of first occurrence, sorted within each sequence
+
+    >>> _first_events([((3,), (1,)), ((2, 3),)])
+    [1, 3, 2]
+    """
+    events = []
+    seen = set()
+    for seq in sequences:
+        for event in sorted(set(flatten(seq))):
+            if event not in seen:
+                seen.add(event)
+                events.append(event)
+
+    return events
+
+
+_worker_indexes = None
+_worker_weights = None
+_worker_constraints = None
+
+
+def _init_worker(indexes, weights, constraints):
+    """Keep the position indexes and weights of sequences and the constraints in a pool worker, for _count_batch"""
+    global _worker_indexes, _worker_weights, _worker_constraints
+    _worker_indexes = indexes
+    _worker_weights = weights
+    _worker_constraints = constraints
+
+
+def _count_batch(candidates):
+    """Count support counts of a batch of candidates in the worker's sequences"""
+    return [support_count(candidate, None, _worker_weights, _worker_indexes, **_worker_constraints)
+            for candidate in candidates]
+
+
+class SequenceLattice(object):
+    """
+    Frequent sequences by level (number of events), in the order they were found, with a hash set of each level for
+    constant time membership checks
+
+    >>> lattice = SequenceLattice([((1,),), ((2,),)])
+    >>> lattice.add_level(lattice.prune(lattice.join(2), 2)[:3])
+    >>> lattice.levels[2], ((1,), (2,)) in lattice, ((2, 1),) in lattice
+    ([((1,), (1,)), ((1,), (2,)), ((1, 2),)], True, False)
+    >>> lattice.join(3)
+    [((1,), (1,), (1,)), ((1,), (1,), (2,)), ((1,), (1, 2))]
+    >>> lattice.prune([((1,), (2,), (2,)), ((1, 2), (1,))], 3)
+    []
+    """
+
+    def __init__(self, first_level=()):
+        """
+        :param first_level: list of frequent 1-sequences
+        """
+        self.levels = [[]]  # k index, zero always empty
+        self.sets = [set()]
+        self.add_level(first_level)
+
+    def add_level(self, sequences):
+        """Add the frequent sequences of the next level"""
+        self.levels.append(list(sequences))
+        self.sets.append(set(sequences))
+
+    def __contains__(self, sequence):
+        k = len(flatten(sequence))
+        return k < len(self.sets) and sequence in self.sets[k]
+
+    def join(self, k):
+        """Get distinct candidate k-sequences joined from frequent (k-1)-sequences, in generation order"""
+        seen = set()
+        candidates = []
+        for can_seq in _sequential_candidate_generation(self.levels[k - 1], k):
+            if can_seq not in seen:
+                seen.add(can_seq)
+                candidates.append(can_seq)
+
+        return candidates
+
+    def prune(self, candidates, k, contiguous=False):
+        """Drop candidate k-sequences that have an infrequent (contiguous if contiguous is True) (k-1)-subsequence"""
+        return [can_seq for can_seq in candidates
+                if all(subseq in self.sets[k - 1] for subseq in get_subsequences(can_seq, contiguous))]
+
+
+def _frequent_levels(sequences, support, fixed_k=None):
+    """
+    Order frequent sequences found by any engine into levels, in the order the apriori engine finds them
+
+    :param sequences: list of sequences containing elements containing events
+    :param support: dict of all frequent sequences -> support count
+    :return: list of lists of frequent k-sequences at index k
+    """
+    lattice = SequenceLattice([((event,),) for event in _first_events(sequences) if ((event,),) in support])
+
+    k = 1
+    while lattice.levels[k] and (not fixed_k or k < fixed_k):
+        k += 1
+        lattice.add_level([can_seq for can_seq in lattice.join(k) if can_seq in support])
+
+    return lattice.levels
+
+
+def apriori_sequential(sequences, minsup, fixed_k=None, verbose=False, weights=None, engine='apriori', min_gap=None,
+                       max_gap=None, window_size=None):
     """
     Apriori method for sequential patterns
 
-    :param sequences: list of iterables (list of sequences containing items)
+    With engine 'apriori' and NUM_CORES > 1, candidates are counted in a process pool, in batches of candidates.
+
+    :param sequences: list of iterables (list of sequences containing items), or of SparseSequences
     :param all_items: list distinct items
     :param minsup: minimum support
+    :param weights: multiplicities of sequences, see deduplicate_sequences
+    :param engine: 'apriori' (count candidates by scanning sequences), 'spade' (join id-lists of (sequence, element)
+                   positions) or 'prefixspan' (grow prefixes in pseudo-projected sequences), all return the same
+                   patterns in the same order
+    :param min_gap: minimum gap between consecutive pattern elements, see contains (engine 'apriori' only)
+    :param max_gap: maximum gap between consecutive pattern elements, see contains (engine 'apriori' only)
+    :param window_size: maximum time span of a pattern element, see contains (engine 'apriori' only)
 
     >>> seqs = [((1, 2, 4), (2, 3), (5,)), \
                 ((1, 2), (2, 3, 4)), \
@@ -166,63 +462,108 @@ def apriori_sequential(sequences, minsup, fixed_k=None, verbose=False):
      {((2,), (3,)): 0.8},
      {((2, 4),): 0.8},
      {((3,), (5,)): 0.8}]
+    >>> unique, weights = deduplicate_sequences(seqs + seqs[:1])
+    >>> apriori_sequential(unique, 0.8, weights=weights) == apriori_sequential(seqs + seqs[:1], 0.8)
+    True
+    >>> apriori_sequential(seqs, 0.6, engine='spade') == apriori_sequential(seqs, 0.6)
+    True
+    >>> apriori_sequential(seqs, 0.6, engine='prefixspan') == apriori_sequential(seqs, 0.6)
+    True
+    >>> apriori_sequential([((1,), (1,), (1,))], 1.0)
+    [{((1,),): 1.0}, {((1,), (1,)): 1.0}, {((1,), (1,), (1,)): 1.0}]
     >>> seqs = [((1,), (), (), (2,), (), (), (3,)), \
                 ((1, 2,), (), (2,3 ), (2,), (), (3,), ()), \
                 ((1,), (2,), (), (2,), (3,), (3,), (2, 3, 4))]
+    >>> apriori_sequential(seqs, 0.9, fixed_k=2)
+    [{((1,), (2,)): 1.0}, {((1,), (3,)): 1.0}, {((2,), (3,)): 1.0}]
+    >>> apriori_sequential(seqs, 0.9, fixed_k=2, max_gap=3)
+    [{((1,), (2,)): 1.0}, {((2,), (3,)): 1.0}]
+    >>> sparse_seqs = [SparseSequence.from_elements(seq) for seq in seqs]
+    >>> apriori_sequential(sparse_seqs, 0.6, max_gap=3) == apriori_sequential(seqs, 0.6, max_gap=3)
+    True
     """
 
+    if engine not in ENGINES:
+        raise ValueError('Unknown engine %s, expected one of %s' % (engine, ', '.join(ENGINES)))
+
+    constraints = dict(min_gap=min_gap, max_gap=max_gap, window_size=window_size)
+    if engine != 'apriori' and any(value is not None for value in constraints.values()):
+        raise ValueError('Time constraints are only supported by the apriori engine')
+
+    if engine != 'apriori':
+        mine = spade.spade_support if engine == 'spade' else prefixspan.prefixspan_support
+        support = mine(sequences, minsup, fixed_k=fixed_k, verbose=verbose, weights=weights)
+        N = len(sequences) if weights is None else sum(weights)
+        return _format_frequent(_frequent_levels(sequences, support, fixed_k), support, N, fixed_k)
+
     k = 1
-    N = len(sequences)
+    if weights is None:
+        weights = [1] * len(sequences)
+    N = sum(weights)
 
-    frequent_sequences = [[], []]  # k index, zero always empty
+    frequent_1_sequences = []
     support = defaultdict(int)
 
     if verbose:
         print('Initializing length 1 frequent sequences...')
 
-    for seq in sequences:
-        events = sorted(set(flatten(seq)))
-        for event in events:
-            event_seq = ((event,),)
-            if event_seq not in support:
-                support[event_seq] = support_count(event_seq, sequences)
+    indexes = [position_index(seq) for seq in sequences]
 
-                #print "k==1, event seq: %s - support: %s" % (event_seq, support[event_seq])
+    for event in _first_events(sequences):
+        event_seq = ((event,),)
+        support[event_seq] = support_count(event_seq, sequences, weights, indexes)
 
-                if support[event_seq] >= N * minsup and event_seq not in frequent_sequences[1]:
-                    frequent_sequences[1].append(event_seq)
+        #print "k==1, event seq: %s - support: %s" % (event_seq, support[event_seq])
 
-    if verbose:
-        print('Initialized %s frequent 1-sequences' % len(frequent_sequences[1]))
-        print('Generating longer frequent sequences...')
+        if support[event_seq] >= N * minsup:
+            frequent_1_sequences.append(event_seq)
 
-    pruned_candidates = ['dummy', 'dummy']
+    lattice = SequenceLattice(frequent_1_sequences)
 
-    while pruned_candidates and len(pruned_candidates) > 1 and (not fixed_k or k < fixed_k):
-        k += 1
-        candidate_seqs = _sequential_candidate_generation(frequent_sequences[k - 1], k)
-        if verbose:
-            print('k=%s - candidate sequence count %s' % (k, len(candidate_seqs),))
-        if not candidate_seqs:
-            break
+    if verbose:
+        print('Initialized %s frequent 1-sequences' % len(frequent_1_sequences))
+        print('Generating longer frequent sequences...')
 
-        pruned_candidates = []
+    pool = None
+    if NUM_CORES > 1:
+        pool = multiprocessing.Pool(NUM_CORES, initializer=_init_worker, initargs=(indexes, weights, constraints))
+
+    try:
+        while lattice.levels[k] and (not fixed_k or k < fixed_k):
+            k += 1
+            candidate_seqs = lattice.join(k)
+            if verbose:
+                print('k=%s - candidate sequence count %s' % (k, len(candidate_seqs),))
+            if not candidate_seqs:
+                break
+
+            pruned_candidates = lattice.prune(candidate_seqs, k, contiguous=max_gap is not None)
+
+            if pool is not None:
+                batches = [pruned_candidates[start:end] for start, end in
+                           shard_bounds(len(pruned_candidates), NUM_CORES * _BATCHES_PER_CORE)]
+                for batch, counts in zip(batches, pool.map(_count_batch, batches)):
+                    support.update(zip(batch, counts))
+            else:
+                for pruned_index, pruned_seq in enumerate(pruned_candidates):
+                    if verbose and k > 3 and len(pruned_candidates) > 50 \
+                            and pruned_index % (1 + len(pruned_candidates) // 5) == 0:
+                        print('Candidate %s / %s' % (pruned_index, len(pruned_candidates)))
+                    for index, weight in zip(indexes, weights):
+                        if contains(pruned_seq, index, **constraints):
+                            support[pruned_seq] += weight
 
-        for can_seq in candidate_seqs:
-            subseqs = get_subsequences(can_seq)
-            if all([subseq in frequent_sequences[k - 1] for subseq in subseqs]) and can_seq not in pruned_candidates:
-                pruned_candidates.append(can_seq)
+            lattice.add_level([seq for seq in pruned_candidates if support[seq] >= N * minsup])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
-        for pruned_index, pruned_seq in enumerate(pruned_candidates):
-            if verbose and k > 3 and len(pruned_candidates) > 50 \
-                    and pruned_index % (1 + len(pruned_candidates) / 5) == 0:
-                print('Candidate %s / %s' % (pruned_index, len(pruned_candidates)))
-            for seq in sequences:
-                if is_subsequence(pruned_seq, seq):
-                    support[pruned_seq] += 1
+    return _format_frequent(lattice.levels, support, N, fixed_k)
 
-        frequent_sequences.append([seq for seq in pruned_candidates if support[seq] >= N * minsup])
 
+def _format_frequent(frequent_sequences, support, N, fixed_k=None):
+    """Get list of {frequent sequence: support} from levels of frequent sequences"""
     if fixed_k:
         try:
             freq_items = [{freqseq: support[freqseq] / float(N)} for freqseq in frequent_sequences[fixed_k]]
@@ -0,0 +1,292 @@
+"""Implementation of the Eclat algorithm (with dEclat diffsets), mining frequent itemsets depth-first from tidsets."""
+
+from collections import defaultdict
+
+
+def _item_tidsets(transactions, all_items):
+    """
+    Get transaction id sets of items
+
+    >>> sorted((item, sorted(tids)) for item, tids in _item_tidsets(['AB', 'B', 'BC'], 'ABC').items())
+    [('A', [0]), ('B', [0, 1, 2]), ('C', [2])]
+    """
+    all_items = set(all_items)
+    tidsets = defaultdict(set)
+    for tid, transaction in enumerate(transactions):
+        for item in transaction:
+            if item in all_items:
+                tidsets[item].add(tid)
+
+    return tidsets
+
+
+def _weigher(weights):
+    """
+    Get a function giving the support count of a set of transaction ids
+
+    >>> _weigher(None)(set([0, 2])), _weigher([1, 5, 3])(set([0, 2]))
+    (2, 4)
+    """
+    if weights is None:
+        return len
+
+    return lambda tids: sum(weights[tid] for tid in tids)
+
+
+def _eclat(prefix, members, diff_mode, min_count, max_k, diffsets, support, weigh=len):
+    """
+    Extend a prefix equivalence class depth-first
+
+    :param prefix: tuple of items shared by the class
+    :param members: list of (item, ids, support count), where ids are tidsets or diffsets relative to the prefix
+    :param diff_mode: True if member ids are diffsets
+    :param min_count: minimum support count
+    :param max_k: maximum itemset length or None
+    :param diffsets: True / False to force diffsets / tidsets, None to choose per class
+    :param support: dict to store itemset supports in
+    :param weigh: function giving the support count of a set of transaction ids
+    """
+    for index, (item, ids, count) in enumerate(members):
+        itemset = prefix + (item,)
+        support[tuple(sorted(itemset))] = count
+
+        if max_k and len(itemset) >= max_k:
+            continue
+
+        children = []
+        use_diffsets = diff_mode
+        if diff_mode:
+            for other_item, other_ids, _ in members[index + 1:]:
+                diff = other_ids - ids
+                diff_count = count - weigh(diff)
+                if diff_count >= min_count:
+                    children.append((other_item, diff, diff_count))
+        else:
+            intersections = [(other_item, ids & other_ids) for other_item, other_ids, _ in members[index + 1:]]
+            intersections = [(other_item, tids, weigh(tids)) for other_item, tids in intersections]
+            intersections = [intersection for intersection in intersections if intersection[2] >= min_count]
+
+            use_diffsets = diffsets
+            if use_diffsets is None:
+                # Diffsets are smaller than tidsets when the extensions cover most of the prefix transactions
+                use_diffsets = sum(len(ids) - len(tids) for _, tids, _ in intersections) < \
+                    sum(len(tids) for _, tids, _ in intersections)
+
+            if use_diffsets:
+                children = [(other_item, ids - tids, tids_count) for other_item, tids, tids_count in intersections]
+            else:
+                children = intersections
+
+        if children:
+            _eclat(itemset, children, use_diffsets, min_count, max_k, diffsets, support, weigh)
+
+
+def eclat_support(transactions, all_items, minsup, fixed_k=None, verbose=False, diffsets=None, weights=None):
+    """
+    Find frequent itemsets and their support counts with Eclat
+
+    :param transactions: list of iterables (list of transactions containing items)
+    :param all_items: list distinct items
+    :param minsup: minimum support
+    :param fixed_k: only mine itemsets up to this length
+    :param diffsets: True for diffsets (dEclat), False for tidsets, None to pick by density of each class
+    :param weights: multiplicities of transactions
+    :return: dict of frequent itemsets (sorted tuples) -> support count
+
+    >>> sorted(eclat_support(['ABC', 'AB', 'BC', 'B'], 'ABC', 0.5).items())
+    [(('A',), 2), (('A', 'B'), 2), (('B',), 4), (('B', 'C'), 2), (('C',), 2)]
+    >>> eclat_support(['ABC', 'AB', 'BC', 'B'], 'ABC', 0.5, diffsets=True) == \\
+    ...     eclat_support(['ABC', 'AB', 'BC', 'B'], 'ABC', 0.5, diffsets=False)
+    True
+    """
+    weigh = _weigher(weights)
+    min_count = max(weigh(range(len(transactions))) * minsup, 1)
+
+    members = [(item, tids, weigh(tids)) for item, tids in _item_tidsets(transactions, all_items).items()]
+    members = [member for member in members if member[2] >= min_count]
+    members.sort(key=lambda member: (member[2], member[0]))
+
+    if verbose:
+        print('Initialized %s frequent items' % len(members))
+
+    support = {}
+    _eclat((), members, False, min_count, fixed_k, diffsets, support, weigh)
+
+    return support
+
+
+def eclat(transactions, all_items, minsup, fixed_k=None, verbose=False, diffsets=None, weights=None):
+    """
+    Eclat method, returns frequent itemsets in the same order as apriori.apriori
+
+    :param transactions: list of iterables (list of transactions containing items)
+    :param all_items: list distinct items
+    :param minsup: minimum support
+
+    >>> simple_transactions = [('007', '666', '777'), ('007', 'BC',), ('007', '666'), ('777',)]
+    >>> alphabet = ['007', '666', '777', 'BC']
+    >>> eclat(simple_transactions, alphabet, 0.3)
+    [('007',), ('666',), ('777',), ('007', '666')]
+    >>> eclat(simple_transactions, alphabet, 0.5, fixed_k=2)
+    [('007', '666')]
+    >>> eclat(simple_transactions, alphabet, 0.9)
+    []
+    """
+    support = eclat_support(transactions, all_items, minsup, fixed_k=fixed_k, verbose=verbose, diffsets=diffsets,
+                            weights=weights)
+
+    if fixed_k:
+        return sorted(itemset for itemset in support if len(itemset) == fixed_k)
+
+    return sorted(support, key=lambda itemset: (len(itemset), itemset))
+
+
+def _add_closed(itemset, tids, closed, weigh):
+    """Add itemset to closed itemsets (keyed by tidset hash) unless a superset with the same tidset is already there"""
+    key = (len(tids), sum(tids))
+    if not any(itemset <= other for other, _ in closed[key]):
+        closed[key].append((itemset, weigh(tids)))
+
+
+def _charm(nodes, min_count, closed, weigh=len):
+    """
+    Extend CHARM nodes depth-first, skipping branches that cannot produce new closed itemsets
+
+    :param nodes: list of (itemset, tidset) sorted by increasing support
+    :param min_count: minimum support count
+    :param closed: dict of (tidset size, tid sum) -> list of (closed itemset, support count)
+    :param weigh: function giving the support count of a set of transaction ids
+    """
+    nodes = list(nodes)
+    for i in range(len(nodes)):
+        if nodes[i] is None:
+            continue
+        itemset, tids = nodes[i]
+
+        children = []
+        for j in range(i + 1, len(nodes)):
+            if nodes[j] is None:
+                continue
+            other_itemset, other_tids = nodes[j]
+            common = tids & other_tids
+            if weigh(common) < min_count:
+                continue
+
+            if len(common) == len(tids):
+                # Every transaction of this node has the other items too
+                itemset = itemset | other_itemset
+                if len(common) == len(other_tids):
+                    nodes[j] = None
+            else:
+                if len(common) == len(other_tids):
+                    nodes[j] = None
+                children.append((other_itemset, common))
+
+        if children:
+            children = [(itemset | other_itemset, common) for other_itemset, common in children]
+            children.sort(key=lambda node: len(node[1]))
+            _charm(children, min_count, closed, weigh)
+
+        _add_closed(itemset, tids, closed, weigh)
+
+
+def closed_support(transactions, all_items, minsup, verbose=False, weights=None):
+    """
+    Find frequent closed itemsets and their support counts with CHARM
+
+    An itemset is closed if no superset has the same support. The support of any frequent itemset is the largest
+    support of its closed supersets.
+
+    :param transactions: list of iterables (list of transactions containing items)
+    :param all_items: list distinct items
+    :param minsup: minimum support
+    :param weights: multiplicities of transactions
+    :return: dict of closed frequent itemsets (sorted tuples) -> support count
+
+    >>> sorted(closed_support(['ABC', 'AB', 'ABC', 'B'], 'ABC', 0.5).items())
+    [(('A', 'B'), 3), (('A', 'B', 'C'), 2), (('B',), 4)]
+    """
+    weigh = _weigher(weights)
+    min_count = max(weigh(range(len(transactions))) * minsup, 1)
+
+    nodes = [(frozenset([item]), tids) for item, tids in _item_tidsets(transactions, all_items).items()
+             if weigh(tids) >= min_count]
+    nodes.sort(key=lambda node: (len(node[1]), sorted(node[0])))
+
+    closed = defaultdict(list)
+    _charm(nodes, min_count, closed, weigh)
+
+    if verbose:
+        print('Found %s closed itemsets' % sum(len(itemsets) for itemsets in closed.values()))
+
+    return dict((tuple(sorted(itemset)), count) for itemsets in closed.values() for itemset, count in itemsets)
+
+
+def _maximal(itemset, tail, min_count, maximal, weigh=len):
+    """
+    Extend itemset depth-first with tail items, collecting maximal frequent itemsets
+
+    :param itemset: frozenset of items
+    :param tail: list of (item, tidset of itemset + item), all frequent
+    :param min_count: minimum support count
+    :param maximal: list of (maximal itemset, support count) found so far
+    :param weigh: function giving the support count of a set of transaction ids
+    """
+    for i, (item, tids) in enumerate(tail):
+        extended = itemset | frozenset([item])
+
+        new_tail = []
+        for other_item, other_tids in tail[i + 1:]:
+            common = tids & other_tids
+            if len(common) == len(tids):
+                # Every transaction of the extended itemset has the other item too
+                extended |= frozenset([other_item])
+            elif weigh(common) >= min_count:
+                new_tail.append((other_item, common))
+
+        if new_tail:
+            # Skip the branch if even its largest possible itemset is already covered
+            head_union_tail = extended | frozenset(other_item for other_item, _ in new_tail)
+            if not any(head_union_tail <= other for other, _ in maximal):
+                _maximal(extended, new_tail, min_count, maximal, weigh)
+        elif not any(extended <= other for other, _ in maximal):
+            maximal.append((extended, weigh(tids)))
+
+
+def maximal_support(transactions, all_items, minsup, verbose=False, weights=None):
+    """
+    Find maximal frequent itemsets and their support counts
+
+    An itemset is maximal if no superset is frequent. Branches whose items are all covered by a maximal itemset found
+    earlier are skipped.
+
+    :param transactions: list of iterables (list of transactions containing items)
+    :param all_items: list distinct items
+    :param minsup: minimum support
+    :param weights: multiplicities of transactions
+    :return: dict of maximal frequent itemsets (sorted tuples) -> support count
+
+    >>> sorted(maximal_support(['ABC', 'AB', 'ABC', 'B', 'D'], 'ABCD', 0.4).items())
+    [(('A', 'B', 'C'), 2)]
+    """
+    weigh = _weigher(weights)
+    min_count = max(weigh(range(len(transactions))) * minsup, 1)
+
+    tail = [(item, tids) for item, tids in _item_tidsets(transactions, all_items).items() if weigh(tids) >= min_count]
+    tail.sort(key=lambda node: (len(node[1]), node[0]))
+
+    maximal = []
+    _maximal(frozenset(), tail, min_count, maximal, weigh)
+
+    if verbose:
+        print('Found %s maximal itemsets' % len(maximal))
+
+    return dict((tuple(sorted(itemset)), count) for itemset, count in maximal)
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
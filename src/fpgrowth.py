@@ -0,0 +1,169 @@
+"""Implementation of the FP-Growth algorithm, mining frequent itemsets from a compressed prefix tree."""
+
+from collections import defaultdict
+import itertools
+
+
+class _FPNode(object):
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.parent = parent
+        self.count = 0
+        self.children = {}
+
+
+def _build_fptree(weighted_paths, min_count):
+    """
+    Build an FP-tree from item lists with counts
+
+    :param weighted_paths: list of (items, count) pairs
+    :param min_count: minimum support count for items to include
+    :return: root node, header table (dict of item -> list of nodes), dict of item supports
+    """
+    item_counts = defaultdict(int)
+    for items, count in weighted_paths:
+        for item in items:
+            item_counts[item] += count
+
+    frequent = dict((item, count) for item, count in item_counts.items() if count >= min_count)
+
+    root = _FPNode(None, None)
+    header = defaultdict(list)
+
+    for items, count in weighted_paths:
+        node = root
+        for item in sorted((item for item in items if item in frequent), key=lambda item: (-frequent[item], item)):
+            child = node.children.get(item)
+            if child is None:
+                child = _FPNode(item, node)
+                node.children[item] = child
+                header[item].append(child)
+            child.count += count
+            node = child
+
+    return root, header, frequent
+
+
+def _single_path(root):
+    """Return the nodes of the tree if it is a single path, otherwise None"""
+    path = []
+    node = root
+    while node.children:
+        if len(node.children) > 1:
+            return None
+        node = next(iter(node.children.values()))
+        path.append(node)
+
+    return path
+
+
+def _mine_fptree(root, header, frequent, suffix, min_count, max_k, support):
+    """
+    Recursively mine an FP-tree, adding frequent itemsets ending with suffix to support
+
+    :param root: root node of the tree
+    :param header: header table of the tree
+    :param frequent: dict of item supports in the tree
+    :param suffix: tuple of items the tree is conditioned on
+    :param min_count: minimum support count
+    :param max_k: maximum itemset length or None
+    :param support: dict to store itemset supports in
+    """
+    if max_k and len(suffix) >= max_k:
+        return
+
+    path = _single_path(root)
+    if path is not None:
+        # Every combination of a single path is frequent, with the support of its deepest node
+        for length in range(1, len(path) + 1):
+            if max_k and len(suffix) + length > max_k:
+                break
+            for combination in itertools.combinations(path, length):
+                itemset = tuple(sorted(suffix + tuple(node.item for node in combination)))
+                support[itemset] = min(node.count for node in combination)
+        return
+
+    for item in sorted(frequent, key=lambda item: (frequent[item], item)):
+        itemset = suffix + (item,)
+        support[tuple(sorted(itemset))] = frequent[item]
+
+        conditional_paths = []
+        for node in header[item]:
+            prefix = []
+            parent = node.parent
+            while parent.item is not None:
+                prefix.append(parent.item)
+                parent = parent.parent
+            if prefix:
+                conditional_paths.append((prefix, node.count))
+
+        conditional_root, conditional_header, conditional_frequent = _build_fptree(conditional_paths, min_count)
+        if conditional_frequent:
+            _mine_fptree(conditional_root, conditional_header, conditional_frequent, itemset, min_count, max_k, support)
+
+
+def fpgrowth_support(transactions, all_items, minsup, fixed_k=None, verbose=False, weights=None):
+    """
+    Find frequent itemsets and their support counts with FP-Growth
+
+    :param transactions: list of iterables (list of transactions containing items)
+    :param all_items: list distinct items
+    :param minsup: minimum support
+    :param fixed_k: only mine itemsets up to this length
+    :param weights: multiplicities of transactions
+    :return: dict of frequent itemsets (sorted tuples) -> support count
+
+    >>> sorted(fpgrowth_support(['ABC', 'AB', 'BC', 'B'], 'ABC', 0.5).items())
+    [(('A',), 2), (('A', 'B'), 2), (('B',), 4), (('B', 'C'), 2), (('C',), 2)]
+    """
+    all_items = set(all_items)
+    if weights is None:
+        weights = [1] * len(transactions)
+    min_count = max(sum(weights) * minsup, 1)
+
+    weighted_paths = [([item for item in set(t) if item in all_items], weight)
+                      for t, weight in zip(transactions, weights)]
+    root, header, frequent = _build_fptree(weighted_paths, min_count)
+
+    if verbose:
+        print('FP-tree built with %s frequent items' % len(frequent))
+
+    support = {}
+    if frequent:
+        _mine_fptree(root, header, frequent, (), min_count, fixed_k, support)
+
+    return support
+
+
+def fpgrowth(transactions, all_items, minsup, fixed_k=None, verbose=False, weights=None):
+    """
+    FP-Growth method, returns frequent itemsets in the same order as apriori.apriori
+
+    :param transactions: list of iterables (list of transactions containing items)
+    :param all_items: list distinct items
+    :param minsup: minimum support
+
+    >>> simple_transactions = [('007', '666', '777'), ('007', 'BC',), ('007', '666'), ('777',)]
+    >>> alphabet = ['007', '666', '777', 'BC']
+    >>> fpgrowth(simple_transactions, alphabet, 0.3)
+    [('007',), ('666',), ('777',), ('007', '666')]
+    >>> fpgrowth(simple_transactions, alphabet, 0.5, fixed_k=2)
+    [('007', '666')]
+    >>> fpgrowth(simple_transactions, alphabet, 0.9)
+    []
+    """
+    support = fpgrowth_support(transactions, all_items, minsup, fixed_k=fixed_k, verbose=verbose, weights=weights)
+
+    if fixed_k:
+        return sorted(itemset for itemset in support if len(itemset) == fixed_k)
+
+    return sorted(support, key=lambda itemset: (len(itemset), itemset))
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
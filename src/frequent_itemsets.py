@@ -0,0 +1,177 @@
+"""Storage for frequent itemsets with their support counts."""
+
+import numpy as np
+
+
+class FrequentItemsetTable(object):
+    """
+    Frequent itemsets with absolute support counts, indexed for constant time lookup by any ordering of items.
+
+    Iteration gives the itemsets in the same order as apriori.apriori returns them.
+
+    >>> table = FrequentItemsetTable({('A',): 3, ('B',): 2, ('A', 'B'): 2}, 4)
+    >>> table.support_count(('B', 'A'))
+    2
+    >>> table.support(['A'])
+    0.75
+    >>> list(table)
+    [('A',), ('B',), ('A', 'B')]
+    >>> [(k, itemsets) for k, itemsets in table.levels()]
+    [(1, [('A',), ('B',)]), (2, [('A', 'B')])]
+    >>> ('C',) in table
+    False
+    """
+
+    def __init__(self, support, n_transactions, closed=False, maximal=False):
+        """
+        :param support: dict of itemset -> support count
+        :param n_transactions: number of transactions the supports were counted from
+        :param closed: True if the table holds only the closed frequent itemsets
+        :param maximal: True if the table holds only the maximal frequent itemsets
+        """
+        if closed and maximal:
+            raise ValueError('Only one of closed and maximal can be given')
+
+        self.n_transactions = n_transactions
+        self.closed = closed
+        self.maximal = maximal
+        self._itemsets = sorted((tuple(sorted(itemset)) for itemset in support),
+                                key=lambda itemset: (len(itemset), itemset))
+        self._index = dict((frozenset(itemset), count) for itemset, count in support.items())
+
+    def __len__(self):
+        return len(self._itemsets)
+
+    def __iter__(self):
+        return iter(self._itemsets)
+
+    def __contains__(self, itemset):
+        return frozenset(itemset) in self._index
+
+    def itemsets(self):
+        return list(self._itemsets)
+
+    def items(self):
+        """Iterate (itemset, support count) pairs"""
+        for itemset in self._itemsets:
+            yield itemset, self._index[frozenset(itemset)]
+
+    def support_count(self, itemset):
+        """Get absolute support of a frequent itemset, raises KeyError for itemsets not in the table"""
+        return self._index[frozenset(itemset)]
+
+    def get(self, itemset, default=None):
+        return self._index.get(frozenset(itemset), default)
+
+    def support(self, itemset):
+        return self.support_count(itemset) / float(self.n_transactions)
+
+    def derive_support_count(self, itemset):
+        """
+        Get absolute support of an itemset from its supersets in the table.
+
+        For a table of closed itemsets this is the exact support of any frequent itemset, as the largest support of
+        its closed supersets. Raises KeyError if no superset is in the table, and ValueError for any other table, whose
+        supersets only give a lower bound.
+
+        >>> closed = FrequentItemsetTable({('A', 'B'): 3, ('A', 'B', 'C'): 2, ('B',): 4}, 4, closed=True)
+        >>> closed.derive_support_count(('A',)), closed.derive_support_count(('A', 'C'))
+        (3, 2)
+        >>> FrequentItemsetTable({('A', 'B'): 3}, 4, maximal=True).derive_support_count(('A',))
+        Traceback (most recent call last):
+        ...
+        ValueError: Supports of itemsets missing from the table can only be derived from closed itemsets
+        """
+        count = self.get(itemset)
+        if count is not None:
+            return count
+
+        if not self.closed:
+            raise ValueError('Supports of itemsets missing from the table can only be derived from closed itemsets')
+
+        itemset = frozenset(itemset)
+        counts = [count for other, count in self._index.items() if itemset <= other]
+        if not counts:
+            raise KeyError(tuple(sorted(itemset)))
+
+        return max(counts)
+
+    def level(self, k):
+        return [itemset for itemset in self._itemsets if len(itemset) == k]
+
+    def levels(self):
+        """Iterate (k, list of frequent k-itemsets) in increasing k"""
+        level = []
+        for itemset in self._itemsets:
+            if level and len(itemset) != len(level[0]):
+                yield len(level[0]), level
+                level = []
+            level.append(itemset)
+        if level:
+            yield len(level[0]), level
+
+    def to_arrays(self):
+        """
+        Get a compact array representation: item vocabulary, CSR offsets and item indices of itemsets, support counts
+
+        >>> table = FrequentItemsetTable({('A',): 3, ('A', 'B'): 2}, 4)
+        >>> FrequentItemsetTable.from_arrays(**table.to_arrays()).support_count(('A', 'B'))
+        2
+        """
+        vocabulary = sorted(set(item for itemset in self._itemsets for item in itemset))
+        item_ids = dict((item, item_id) for item_id, item in enumerate(vocabulary))
+
+        offsets = np.zeros(len(self._itemsets) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(itemset) for itemset in self._itemsets])
+
+        return dict(vocabulary=np.array(vocabulary) if vocabulary else np.zeros(0, dtype=np.int32),
+                    offsets=offsets,
+                    items=np.array([item_ids[item] for itemset in self._itemsets for item in itemset], dtype=np.int32),
+                    counts=np.array([count for _, count in self.items()], dtype=np.int64),
+                    n_transactions=np.array(self.n_transactions),
+                    closed=np.array(self.closed),
+                    maximal=np.array(self.maximal))
+
+    @classmethod
+    def from_arrays(cls, vocabulary, offsets, items, counts, n_transactions, closed=False, maximal=False):
+        vocabulary = np.asarray(vocabulary).tolist()
+        items = np.asarray(items).tolist()
+        offsets = np.asarray(offsets).tolist()
+
+        support = dict((tuple(vocabulary[item] for item in items[offsets[i]:offsets[i + 1]]), int(count))
+                       for i, count in enumerate(np.asarray(counts).tolist()))
+
+        return cls(support, int(n_transactions), closed=bool(closed), maximal=bool(maximal))
+
+    def __getstate__(self):
+        return self.to_arrays()
+
+    def __setstate__(self, state):
+        self.__dict__.update(self.from_arrays(**state).__dict__)
+
+    def save(self, filename, vocabulary=None):
+        """
+        Save the table to an .npz file with storage.save_itemsets
+
+        >>> import os, tempfile
+        >>> filename = os.path.join(tempfile.mkdtemp(), 'itemsets.npz')
+        >>> FrequentItemsetTable({('A',): 3, ('A', 'B'): 2}, 4).save(filename)
+        >>> FrequentItemsetTable.load(filename).support_count(('B', 'A'))
+        2
+        """
+        import storage
+        storage.save_itemsets(filename, self, vocabulary=vocabulary)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a table saved with save or storage.save_itemsets"""
+        import storage
+        return storage.load_itemsets(filename)
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
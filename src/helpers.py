@@ -10,6 +10,9 @@ import math
 
 from rdflib import Graph, RDF, RDFS, Namespace
 
+from itemcodec import ItemCodec
+from sparse_sequence import SparseSequence
+
 
 nsTaxMeOn = Namespace("http://www.yso.fi/onto/taxmeon/")
 nsRanks = Namespace("http://www.yso.fi/onto/taxonomic-ranks/")
@@ -48,6 +51,40 @@ def read_observation_basket(filename):
     return itemsets
 
 
+def read_observation_basket_chunks(filename, chunk_size):
+    """
+    Read observation itemsets from file in chunks of at most chunk_size itemsets, without reading the whole file.
+
+    :param filename:
+    :param chunk_size: maximum number of itemsets per chunk
+    :return: generator of lists of tuples
+    """
+    with open(filename) as csvfile:
+        transaction_reader = csv.reader(csvfile, delimiter=',', skipinitialspace=True)
+        chunk = []
+        for row in transaction_reader:
+            chunk.append(tuple(sorted(row)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+
+def read_encoded_observation_basket(filename):
+    """
+    Read observation itemsets from file, with species encoded as integer ids.
+
+    :param filename:
+    :return: ItemCodec, list of tuples of ids
+    """
+    itemsets = read_observation_basket(filename)
+    codec = ItemCodec.from_transactions(itemsets)
+
+    return codec, codec.encode_transactions(itemsets)
+
+
 def get_species(itemsets):
     return set([species for itemset in itemsets for species in itemset])
 
@@ -69,11 +106,12 @@ def get_all_taxa():
     return list(set([item for itemset in itemsets for item in itemset]))
 
 
-def get_yearly_sequences(prune_common_species = False):
+def get_yearly_sequences(prune_common_species = False, sparse=False):
     '''
     Put each years' observations into separate sequence
 
     :param prune_common_species: Leave out the most commonly (year round) observed species
+    :param sparse: Return SparseSequences holding only the days with observations, with their day offsets
     :return:
     '''
     sequences = read_observation_sequences(DATA_DIR + 'observation.sequence')
@@ -87,9 +125,30 @@ def get_yearly_sequences(prune_common_species = False):
         year_seqs.append([[species for species, _, _ in sorted(seq) if species not in pruned_species]
                           for seq in good_seqs])
 
+    if sparse:
+        return [SparseSequence.from_elements(seq) for seq in year_seqs]
+
     return year_seqs
 
 
+def get_encoded_yearly_sequences(prune_common_species=False, sparse=False):
+    '''
+    Get yearly sequences with species encoded as integer ids
+
+    :param prune_common_species: Leave out the most commonly (year round) observed species
+    :param sparse: Return SparseSequences holding only the days with observations, with their day offsets
+    :return: ItemCodec, list of sequences
+    '''
+    year_seqs = get_yearly_sequences(prune_common_species=prune_common_species)
+    codec = ItemCodec.from_sequences(year_seqs)
+    year_seqs = codec.encode_sequences(year_seqs)
+
+    if sparse:
+        return codec, [SparseSequence.from_elements(seq) for seq in year_seqs]
+
+    return codec, year_seqs
+
+
 def get_all_names(finnish_list):
     '''
     Get scientific name and english name from finnish name
@@ -0,0 +1,148 @@
+"""Incremental maintenance of frequent itemsets and rules when new transactions are added (FUP algorithm).
+
+An itemset that was infrequent in the old transactions can only become frequent if it is frequent among the new
+transactions, so the old transactions are scanned only for such itemsets.
+"""
+
+from collections import defaultdict
+import itertools
+
+import apriori as a
+from frequent_itemsets import FrequentItemsetTable
+from rules import RuleGenerator
+
+
+def update_frequent_itemsets(table, transactions, new_transactions, all_items, minsup, weights=None,
+                             new_weights=None, verbose=False):
+    """
+    Update frequent itemsets with new transactions
+
+    :param table: FrequentItemsetTable of all frequent itemsets of transactions with minsup, of every length (not
+                  closed, maximal or mined with fixed_k), as itemsets missing from it are taken to be infrequent
+    :param transactions: old transactions, scanned only for itemsets that were infrequent but may be frequent now
+    :param new_transactions: list of iterables (new transactions containing items)
+    :param all_items: list distinct items of old and new transactions
+    :param minsup: minimum support
+    :param weights: multiplicities of old transactions
+    :param new_weights: multiplicities of new transactions
+    :return: FrequentItemsetTable of frequent itemsets of old and new transactions
+
+    >>> old = [('007', '666', '777'), ('007', 'BC',), ('007', '666'), ('777',)]
+    >>> new = [('666', '777'), ('666', '777', 'BC')]
+    >>> alphabet = ['007', '666', '777', 'BC']
+    >>> table = update_frequent_itemsets(a.apriori(old, alphabet, 0.3, as_table=True), old, new, alphabet, 0.3)
+    >>> list(table.items()) == list(a.apriori(old + new, alphabet, 0.3, as_table=True).items())
+    True
+    >>> table.itemsets()
+    [('007',), ('666',), ('777',), ('BC',), ('007', '666'), ('666', '777')]
+    >>> update_frequent_itemsets(a.apriori(old, alphabet, 0.3, as_table=True, fixed_k=2), old, new, alphabet, 0.3)
+    Traceback (most recent call last):
+    ...
+    ValueError: The table must contain frequent itemsets of every length, not only those of fixed_k
+    """
+    if table.closed or table.maximal:
+        raise ValueError('The table must contain all frequent itemsets, not only closed or maximal ones')
+    # Tables of all frequent itemsets are downward closed, which fixed_k > 1 tables are not
+    if any(table.get(subset) is None for itemset in table if len(itemset) > 1
+           for subset in itertools.combinations(itemset, len(itemset) - 1)):
+        raise ValueError('The table must contain frequent itemsets of every length, not only those of fixed_k')
+
+    n_new = a._total_weight(new_transactions, new_weights)
+    N = table.n_transactions + n_new
+
+    support = {}
+    frequent_itemsets = [[]]  # k index, zero always empty
+    candidates = [(item,) for item in sorted(all_items)]
+    k = 1
+
+    while candidates:
+        new_support = defaultdict(int)
+        a._count_candidates(candidates, new_transactions, k, new_support, new_weights)
+
+        rescan = []
+        for cand in candidates:
+            old_count = table.get(cand)
+            if old_count is not None:
+                if old_count + new_support[cand] >= N * minsup:
+                    support[cand] = old_count + new_support[cand]
+            elif new_support[cand] and new_support[cand] >= n_new * minsup:
+                rescan.append(cand)
+
+        if rescan:
+            old_support = defaultdict(int)
+            a._count_candidates(rescan, transactions, k, old_support, weights)
+            for cand in rescan:
+                if old_support[cand] + new_support[cand] >= N * minsup:
+                    support[cand] = old_support[cand] + new_support[cand]
+
+        frequent_itemsets.append([cand for cand in candidates if cand in support])
+
+        if verbose:
+            print('k=%s - candidate itemsets: %s - rescanned: %s - frequent itemsets: %s' %
+                  (k, len(candidates), len(rescan), len(frequent_itemsets[k])))
+
+        k += 1
+        candidates = a._subset_prune(a._apriori_gen(frequent_itemsets[k - 1]), frequent_itemsets, k)
+
+    return FrequentItemsetTable(support, N)
+
+
+def update_rules(rules, table, new_table, new_transactions, minconf, maxconf=None, fixed_consequents=(),
+                 fixed_antecedents=(), verbose=False):
+    """
+    Update rules generated from table to the updated table new_table
+
+    An itemset whose items are not in any new transaction keeps the support counts of all its subsets, so its rules
+    and their confidences stay the same, and only support, lift and IS measure are recomputed for the new number of
+    transactions. Rules are generated from scratch only for the other itemsets.
+
+    :param rules: rules as returned by RuleGenerator.rule_generation for table with the same parameters
+    :param table: FrequentItemsetTable the rules were generated from
+    :param new_table: FrequentItemsetTable as returned by update_frequent_itemsets
+    :param new_transactions: list of iterables (new transactions containing items)
+    :return: rules for new_table, in the same order as RuleGenerator.rule_generation returns them
+
+    >>> old = [('007', '666', '777'), ('007', 'BC',), ('007', '666'), ('777',)]
+    >>> new = [('666', '777'), ('007', '666')]
+    >>> alphabet = ['007', '666', '777', 'BC']
+    >>> table = a.apriori(old, alphabet, 0.3, as_table=True)
+    >>> rules = RuleGenerator(None, table).rule_generation(0.5)
+    >>> new_table = update_frequent_itemsets(table, old, new, alphabet, 0.3)
+    >>> update_rules(rules, table, new_table, new, 0.5) == RuleGenerator(None, new_table).rule_generation(0.5)
+    True
+    """
+    changed_items = set(item for transaction in new_transactions for item in transaction)
+
+    old_rules = defaultdict(list)
+    for rule in rules:
+        for (antecedent, consequent), measures in rule.items():
+            old_rules[tuple(sorted(antecedent + consequent))].append((antecedent, consequent, measures[0]))
+
+    ruler = RuleGenerator(None, new_table)
+    sets = ruler._select_itemsets(fixed_consequents=fixed_consequents, fixed_antecedents=fixed_antecedents)
+
+    new_rules = []
+    regenerated = 0
+    for itemset in sets:
+        if itemset in table and not changed_items.intersection(itemset):
+            for antecedent, consequent, conf in old_rules[itemset]:
+                new_rules.append({(antecedent, consequent): (conf,
+                                                             ruler.support(antecedent, consequent),
+                                                             ruler.lift(antecedent, consequent),
+                                                             ruler.IS_measure(antecedent, consequent))})
+        else:
+            new_rules += ruler._generate_rules([itemset], minconf, maxconf, fixed_consequents, fixed_antecedents)
+            regenerated += 1
+
+    if verbose:
+        print('Regenerated rules of %i of %i itemsets' % (regenerated, len(sets)))
+
+    return new_rules
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
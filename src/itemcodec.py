@@ -0,0 +1,99 @@
+"""Dictionary encoding of items (species names etc.) as dense integer ids for data mining."""
+
+
+class ItemCodec(object):
+    """
+    Map items to dense integer ids and back.
+
+    Ids are assigned in sorted item order, so mining results over ids decode to the same order as mining over the items.
+
+    >>> codec = ItemCodec.from_transactions([('varis', 'peippo'), ('harakka',)])
+    >>> codec.encode_transactions([('varis', 'peippo'), ('harakka',)])
+    [(1, 2), (0,)]
+    >>> codec.decode_itemsets([(0,), (1, 2)])
+    [('harakka',), ('peippo', 'varis')]
+    """
+
+    def __init__(self, items):
+        self.items = sorted(set(items))
+        self.ids = dict((item, item_id) for item_id, item in enumerate(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        return cls(item for transaction in transactions for item in transaction)
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        return cls(event for sequence in sequences for element in sequence for event in element)
+
+    def all_ids(self):
+        return list(range(len(self.items)))
+
+    def encode(self, items):
+        """Encode items to a sorted tuple of ids"""
+        return tuple(sorted(self.ids[item] for item in items))
+
+    def decode(self, ids):
+        """Decode ids to a tuple of items"""
+        return tuple(self.items[item_id] for item_id in ids)
+
+    def encode_transactions(self, transactions):
+        return [self.encode(transaction) for transaction in transactions]
+
+    def encode_sequences(self, sequences):
+        """
+        Encode sequences of elements of events
+
+        >>> codec = ItemCodec.from_sequences([[['tylli'], [], ['alli', 'tylli']]])
+        >>> codec.encode_sequences([[['tylli'], [], ['alli', 'tylli']]])
+        [((1,), (), (0, 1))]
+        """
+        return [tuple(self.encode(element) for element in sequence) for sequence in sequences]
+
+    def decode_itemsets(self, itemsets):
+        return [self.decode(itemset) for itemset in itemsets]
+
+    def decode_sequences(self, frequent_sequences):
+        """
+        Decode frequent sequences as returned by apriori_sequential
+
+        >>> ItemCodec(['alli', 'tylli']).decode_sequences([{((0,), (0, 1)): 0.5}])
+        [{(('alli',), ('alli', 'tylli')): 0.5}]
+        """
+        return [dict((tuple(self.decode(element) for element in pattern), support)
+                     for pattern, support in freq_seq.items())
+                for freq_seq in frequent_sequences]
+
+    def decode_rules(self, rules):
+        """
+        Decode rules as returned by RuleGenerator.rule_generation
+
+        >>> ItemCodec(['alli', 'tylli']).decode_rules([{((0,), (1,)): (1.0, 0.5, 1.0, 0.7)}])
+        [{(('alli',), ('tylli',)): (1.0, 0.5, 1.0, 0.7)}]
+        """
+        return [dict(((self.decode(antecedent), self.decode(consequent)), measures)
+                     for (antecedent, consequent), measures in rule.items())
+                for rule in rules]
+
+    def decode_sequential_rules(self, rules):
+        """
+        Decode rules as returned by SequentialRuleGenerator.rule_generation
+
+        >>> ItemCodec(['alli', 'tylli']).decode_sequential_rules([{(((0,),), ((0, 1),)): (1.0, 0.5, 1.0, 0.7)}])
+        [{((('alli',),), (('alli', 'tylli'),)): (1.0, 0.5, 1.0, 0.7)}]
+        """
+        return [dict(((tuple(self.decode(element) for element in prefix),
+                       tuple(self.decode(element) for element in continuation)), measures)
+                     for (prefix, continuation), measures in rule.items())
+                for rule in rules]
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
@@ -2,47 +2,97 @@
 Analyse observation basket
 '''
 import argparse
-import joblib
 
 import pandas as pd
 
 import apriori
 import helpers
-from rules import RuleGenerator
+import partition
+import rules as rg
+import storage
+from itemcodec import ItemCodec
+from rules import MEASURES, RuleGenerator
 
 parser = argparse.ArgumentParser(description='Convert Halias RDF dataset for data mining')
 parser.add_argument('minsup', help='Minimum support', nargs='?', type=float, default=0.8)
+parser.add_argument('--engine', help='Frequent itemset mining engine', choices=apriori.ENGINES, default='apriori')
+parser.add_argument('--cores', help='How many CPU cores to use for support counting and rule generation', type=int,
+                    default=1)
+parser.add_argument('--closed', help='Mine only closed frequent itemsets', action='store_true')
+parser.add_argument('--maximal', help='Mine only maximal frequent itemsets', action='store_true')
+parser.add_argument('--chunk-size', help='Mine the basket file in chunks of this many baskets (partition algorithm), '
+                                         'without loading it into memory', type=int, default=None)
+parser.add_argument('--top-rules', help='Keep only this many best rules', type=int, default=None)
+parser.add_argument('--measure', help='Measure to pick the best rules by', choices=MEASURES, default='lift')
+parser.add_argument('--consequents', help='Only rules predicting one of these species', nargs='+', default=[])
+parser.add_argument('--antecedents', help='Only rules with one of these species as antecedent', nargs='+', default=[])
 args = parser.parse_args()
 
-apriori.NUM_CORES = 1
+if args.chunk_size and (args.closed or args.maximal):
+    parser.error('--closed and --maximal cannot be used with --chunk-size')
+
+apriori.NUM_CORES = args.cores
+rg.NUM_CORES = args.cores
 
 
 MINSUP = args.minsup
+BASKET_FILE = helpers.DATA_DIR + 'observation.basket'
+
+if args.chunk_size:
+    codec = ItemCodec(item for chunk in helpers.read_observation_basket_chunks(BASKET_FILE, args.chunk_size)
+                      for itemset in chunk for item in itemset)
+
+    def read_chunks():
+        return (codec.encode_transactions(chunk)
+                for chunk in helpers.read_observation_basket_chunks(BASKET_FILE, args.chunk_size))
+
+    itemsets, weights = None, None
+
+    print(len(codec))
 
-itemsets = helpers.read_observation_basket(helpers.DATA_DIR + 'observation.basket')
+    print('\nSupport {:.3f} frequent itemsets:\n'.format(MINSUP))
 
-all_items = list(set([item for itemset in itemsets for item in itemset]))
+    freq_table = partition.partition_apriori(read_chunks, codec.all_ids(), MINSUP, verbose=True, engine=args.engine,
+                                             as_table=True)
+else:
+    codec, itemsets = helpers.read_encoded_observation_basket(BASKET_FILE)
+    print(len(itemsets))
 
-print(len(itemsets))
-print(len(all_items))
-#print(itemsets[:1])
+    itemsets, weights = apriori.deduplicate_transactions(itemsets)
 
-print('\nSupport {:.3f} frequent itemsets:\n'.format(MINSUP))
+    all_items = codec.all_ids()
 
-freq_items = apriori.apriori(itemsets, all_items, MINSUP, verbose=True)
+    print(len(itemsets))
+    print(len(all_items))
+    #print(itemsets[:1])
 
-print(freq_items[-1])
+    print('\nSupport {:.3f} frequent itemsets:\n'.format(MINSUP))
+
+    freq_table = apriori.apriori(itemsets, all_items, MINSUP, verbose=True, engine=args.engine,
+                                 closed=args.closed, maximal=args.maximal, weights=weights, as_table=True)
+
+freq_items = freq_table.itemsets()
+
+print(codec.decode(freq_items[-1]))
 print(len(freq_items))
 
-joblib.dump(freq_items, helpers.DATA_DIR + 'freq_items_{:.3f}.pkl'.format(MINSUP))
+storage.save_itemsets(helpers.DATA_DIR + 'freq_items_{:.3f}.npz'.format(MINSUP), freq_table, vocabulary=codec.items)
+
+ruler = RuleGenerator(itemsets, freq_table, weights=weights)
 
-ruler = RuleGenerator(itemsets, freq_items)
+fixed_consequents = codec.encode(args.consequents)
+fixed_antecedents = codec.encode(args.antecedents)
 
-rules = ruler.rule_generation(0.5) #, fixed_consequents=[('varis',)])
+if args.top_rules:
+    rules = ruler.top_rules(args.top_rules, 0.5, measure=args.measure, fixed_consequents=fixed_consequents,
+                            fixed_antecedents=fixed_antecedents)
+else:
+    rules = ruler.rule_generation(0.5, fixed_consequents=fixed_consequents, fixed_antecedents=fixed_antecedents)
 
 print(len(rules))
 
-joblib.dump(rules, helpers.DATA_DIR + 'freq_rules_{:.3f}.pkl'.format(MINSUP))
+rule_store = storage.RuleStore.from_rules(rules, vocabulary=codec.items)
+rule_store.save(helpers.DATA_DIR + 'freq_rules_{:.3f}.npz'.format(MINSUP))
 
 #for (rule, conf) in rules:
 #    print(' -> %s \t conf: {:.2f} \t supp: {:.3f}'.format(conf, ruler.support(*rule)))
\ No newline at end of file
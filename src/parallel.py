@@ -0,0 +1,26 @@
+"""Helpers for splitting work between the processes of a multiprocessing pool."""
+
+
+def shard_bounds(n, parts):
+    """
+    Split range(n) into at most parts contiguous slices
+
+    :param n: number of work items
+    :param parts: maximum number of slices
+    :return: list of (start, end) bounds of the slices
+
+    >>> shard_bounds(10, 3)
+    [(0, 4), (4, 8), (8, 10)]
+    >>> shard_bounds(0, 3)
+    []
+    """
+    size = max(1, -(-n // parts))
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
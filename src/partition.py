@@ -0,0 +1,103 @@
+"""Partition algorithm (Savasere et al.) for mining frequent itemsets from data read in chunks.
+
+Any globally frequent itemset is frequent in at least one chunk, so the union of locally frequent itemsets is a
+complete candidate set. The first pass mines each chunk in memory, the second pass counts exact global supports of
+the candidates chunk by chunk. Only one chunk of transactions is held in memory at a time.
+"""
+
+from collections import defaultdict
+
+import apriori as a
+from frequent_itemsets import FrequentItemsetTable
+
+
+def _local_candidates(read_chunks, all_items, minsup, fixed_k, verbose, engine):
+    """
+    Mine locally frequent itemsets of each chunk
+
+    :return: set of candidate itemsets (sorted tuples), total number of transactions
+    """
+    candidates = set()
+    N = 0
+
+    for i, chunk in enumerate(read_chunks()):
+        unique, weights = a.deduplicate_transactions(chunk)
+        local = a.apriori(unique, all_items, minsup, fixed_k=fixed_k, engine=engine, weights=weights)
+        candidates.update(local)
+        N += len(chunk)
+
+        if verbose:
+            print('Chunk %s: %s transactions - %s locally frequent itemsets - %s candidates' %
+                  (i, len(chunk), len(local), len(candidates)))
+
+    return candidates, N
+
+
+def partition_support(read_chunks, all_items, minsup, fixed_k=None, verbose=False, engine='apriori'):
+    """
+    Find frequent itemsets and their support counts with the partition algorithm
+
+    :param read_chunks: function returning a fresh iterable of chunks (lists of transactions), called twice
+    :param all_items: list distinct items
+    :param minsup: minimum support
+    :param fixed_k: only mine itemsets of this length
+    :param engine: engine for mining chunks, see apriori.apriori
+    :return: dict of frequent itemsets (sorted tuples) -> support count, total number of transactions
+
+    >>> chunks = [['ABC', 'AB'], ['BC', 'B'], ['AB']]
+    >>> support, N = partition_support(lambda: iter(chunks), 'ABC', 0.4)
+    >>> sorted(support.items()), N
+    ([(('A',), 3), (('A', 'B'), 3), (('B',), 5), (('B', 'C'), 2), (('C',), 2)], 5)
+    """
+    candidates, N = _local_candidates(read_chunks, all_items, minsup, fixed_k, verbose, engine)
+
+    levels = defaultdict(list)
+    for itemset in candidates:
+        levels[len(itemset)].append(itemset)
+
+    counts = defaultdict(int)
+    for chunk in read_chunks():
+        unique, weights = a.deduplicate_transactions(chunk)
+        for k, level in levels.items():
+            a._count_candidates(level, unique, k, counts, weights)
+
+    support = dict((itemset, counts[itemset]) for itemset in candidates if counts[itemset] >= N * minsup)
+
+    if verbose:
+        print('%s candidates - %s globally frequent itemsets' % (len(candidates), len(support)))
+
+    return support, N
+
+
+def partition_apriori(read_chunks, all_items, minsup, fixed_k=None, verbose=False, engine='apriori', as_table=False):
+    """
+    Partition method, returns frequent itemsets in the same order as apriori.apriori
+
+    :param read_chunks: function returning a fresh iterable of chunks (lists of transactions), called twice
+    :param all_items: list distinct items
+    :param minsup: minimum support
+    :param engine: engine for mining chunks, see apriori.apriori
+    :param as_table: return a FrequentItemsetTable with support counts instead of a list of itemsets
+
+    >>> simple_transactions = [('007', '666', '777'), ('007', 'BC',), ('007', '666'), ('777',)]
+    >>> alphabet = ['007', '666', '777', 'BC']
+    >>> read_chunks = lambda: (simple_transactions[i:i + 3] for i in range(0, len(simple_transactions), 3))
+    >>> partition_apriori(read_chunks, alphabet, 0.3)
+    [('007',), ('666',), ('777',), ('007', '666')]
+    >>> partition_apriori(read_chunks, alphabet, 0.5, fixed_k=2)
+    [('007', '666')]
+    >>> partition_apriori(read_chunks, alphabet, 0.3, engine='eclat', as_table=True).support_count(('007',))
+    3
+    """
+    support, N = partition_support(read_chunks, all_items, minsup, fixed_k=fixed_k, verbose=verbose, engine=engine)
+
+    table = FrequentItemsetTable(support, N)
+    return table if as_table else table.itemsets()
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
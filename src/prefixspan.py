@@ -0,0 +1,130 @@
+"""Implementation of the PrefixSpan algorithm, mining frequent sequences by growing prefixes in projected databases.
+
+Projected databases are pseudo-projections: a pattern is projected to one (sequence id, element index) pointer per
+supporting sequence, at the earliest element where an occurrence of the pattern can end. Only events found after the
+pointers are counted, so candidates that do not occur in the sequences are never generated.
+
+- sequence extension, P + (b): b in an element after the pointer
+- itemset extension, P + (a, b): a and b in an element at or after the pointer, with b > a
+"""
+
+from collections import defaultdict
+
+
+def _element_sets(sequences):
+    """
+    Get sequences as lists of sets of events of their non-empty elements, scanned by _extensions
+
+    >>> _element_sets([((1,), (), (1, 2))])
+    [[{1}, {1, 2}]]
+    """
+    return [[set(element) for element in sequence if element] for sequence in sequences]
+
+
+def _extensions(sequences, last_element, projection):
+    """
+    Scan a projected database for events extending the prefix
+
+    :param sequences: list of sequences as lists of sets of events, see _element_sets
+    :param last_element: last element of the prefix, None for the empty prefix
+    :param projection: list of (sequence id, element index) pointers, element index -1 for the empty prefix
+    :return: dicts of event -> projection of the extended prefix, for itemset extensions and sequence extensions
+
+    >>> sequences = _element_sets([((1,), (1, 2)), ((2,), (1, 3))])
+    >>> itemset_ext, sequence_ext = _extensions(sequences, (1,), [(0, 0), (1, 1)])
+    >>> dict(itemset_ext), dict(sequence_ext)
+    ({2: [(0, 1)], 3: [(1, 1)]}, {1: [(0, 1)], 2: [(0, 1)]})
+    """
+    itemset_ext = defaultdict(list)
+    sequence_ext = defaultdict(list)
+    if last_element is not None:
+        last_events = set(last_element)
+
+    for sid, eid in projection:
+        sequence = sequences[sid]
+        itemset_seen = set()
+        sequence_seen = set()
+        for index in range(max(eid, 0), len(sequence)):
+            element = sequence[index]
+            if index > eid:
+                for event in element - sequence_seen:
+                    sequence_ext[event].append((sid, index))
+                sequence_seen |= element
+            if last_element is not None and last_events <= element:
+                for event in element - itemset_seen:
+                    if event > last_element[-1]:
+                        itemset_ext[event].append((sid, index))
+                itemset_seen |= element
+
+    return itemset_ext, sequence_ext
+
+
+def _prefixspan(prefix, projection, sequences, min_count, max_k, length, support, weigh):
+    """
+    Grow a prefix depth-first from its projected database
+
+    :param prefix: pattern (tuple of sorted tuples)
+    :param projection: list of (sequence id, element index) pointers of the prefix
+    :param min_count: minimum support count
+    :param max_k: maximum pattern length (number of events) or None
+    :param length: number of events in the prefix
+    :param support: dict to store pattern supports in
+    :param weigh: function giving the support count of a projection
+    """
+    itemset_ext, sequence_ext = _extensions(sequences, prefix[-1] if prefix else None, projection)
+
+    for extensions, is_itemset_ext in ((itemset_ext, True), (sequence_ext, False)):
+        for event, child_projection in sorted(extensions.items()):
+            count = weigh(child_projection)
+            if count < min_count:
+                continue
+
+            if is_itemset_ext:
+                pattern = prefix[:-1] + (prefix[-1] + (event,),)
+            else:
+                pattern = prefix + ((event,),)
+            support[pattern] = count
+
+            if not max_k or length + 1 < max_k:
+                _prefixspan(pattern, child_projection, sequences, min_count, max_k, length + 1, support, weigh)
+
+
+def prefixspan_support(sequences, minsup, fixed_k=None, verbose=False, weights=None):
+    """
+    Find frequent sequences and their support counts with PrefixSpan
+
+    :param sequences: list of sequences containing elements containing events, or SparseSequences
+    :param minsup: minimum support
+    :param fixed_k: only mine sequences up to this length (number of events)
+    :param weights: multiplicities of sequences
+    :return: dict of frequent sequences (tuples of sorted tuples) -> support count
+
+    >>> seqs = [((1, 2), (3,)), ((1,), (3,), (2,)), ((1, 2),)]
+    >>> sorted(prefixspan_support(seqs, 0.6).items())
+    [(((1,),), 3), (((1,), (3,)), 2), (((1, 2),), 2), (((2,),), 3), (((3,),), 2)]
+    >>> prefixspan_support(seqs, 0.6, weights=[1, 3, 1])[((1,), (3,))]
+    4
+    """
+    if weights is None:
+        weigh = len
+        N = len(sequences)
+    else:
+        weigh = lambda projection: sum(weights[sid] for sid, _ in projection)
+        N = sum(weights)
+
+    support = {}
+    _prefixspan((), [(sid, -1) for sid in range(len(sequences))], _element_sets(sequences), N * minsup, fixed_k, 0,
+                support, weigh)
+
+    if verbose:
+        print('Found %s frequent sequences' % len(support))
+
+    return support
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
@@ -1,99 +1,511 @@
 # coding=utf-8
+from collections import defaultdict
+import itertools
 import math
+import multiprocessing
+
+import numpy as np
 
 import apriori as a
+from frequent_itemsets import FrequentItemsetTable
+from parallel import shard_bounds
+
+
+NUM_CORES = 1
+
+# Rule measures in the order they are returned for each rule
+MEASURES = ('confidence', 'support', 'lift', 'IS_measure')
+
+# Itemsets are split into this many shards per process, as rules from large itemsets take longer to generate
+_SHARDS_PER_CORE = 4
 
 
 class RuleGenerator(object):
+    """
+    Generate association rules from frequent itemsets.
+
+    Measures are computed from a support index over the frequent itemsets and all their subsets, so the transactions
+    are not rescanned per rule. A table of closed itemsets is used as the index as it is, supports of its subsets are
+    derived from their closed supersets. Subsets of maximal itemsets are counted when the index is built.
+
+    >>> transactions = ['ABC', 'AB', 'BC', 'B']
+    >>> ruler = RuleGenerator(transactions, a.apriori(transactions, 'ABC', 0.5))
+    >>> ruler.confidence(('A',), ('B',)), ruler.support(('A',), ('B',)), ruler.lift(('C',), ('B',))
+    (1.0, 0.5, 1.0)
+    >>> table = a.apriori(transactions, 'ABC', 0.5, as_table=True)
+    >>> RuleGenerator(None, table).get_rule_measurements(('B',), ('A',)) == ruler.get_rule_measurements(('B',), ('A',))
+    True
+    >>> transactions = ['ABC', 'AB', 'AB', 'A', 'B', 'BC']
+    >>> maximal = a.apriori(transactions, 'ABC', 0.3, as_table=True, maximal=True)
+    >>> ruler = RuleGenerator(transactions, maximal)
+    >>> ruler.confidence(('B',), ('A',)), ruler.lift(('B',), ('A',))
+    (0.6, 0.9)
+    >>> RuleGenerator(None, maximal)
+    Traceback (most recent call last):
+    ...
+    ValueError: Transactions are needed to count supports of a list of itemsets or of maximal itemsets
+    >>> RuleGenerator(None, a.apriori(transactions, 'ABC', 0.3, as_table=True, fixed_k=2)).rule_generation(0.1)
+    Traceback (most recent call last):
+    ...
+    ValueError: Transactions are needed to count supports of itemsets missing from a table of non-closed itemsets
+    """
 
-    def __init__(self, transactions, frequent_itemsets):
+    def __init__(self, transactions, frequent_itemsets, weights=None):
+        """
+        :param transactions: list of iterables (list of transactions containing items), can be None if
+                             frequent_itemsets is a FrequentItemsetTable of closed frequent itemsets or of all frequent
+                             itemsets of every length (not mined with fixed_k)
+        :param frequent_itemsets: list of frequent itemsets or a FrequentItemsetTable with their supports
+        :param weights: multiplicities of transactions, see apriori.deduplicate_transactions
+        """
         self.transactions = transactions
-        self.frequent_itemsets = frequent_itemsets
-        self.N = len(transactions)
+        self.weights = weights
+
+        if isinstance(frequent_itemsets, FrequentItemsetTable) and not frequent_itemsets.maximal:
+            self.support_index = frequent_itemsets
+        elif transactions is None:
+            raise ValueError('Transactions are needed to count supports of a list of itemsets or of maximal itemsets')
+        else:
+            self.support_index = self._build_support_index(frequent_itemsets)
+
+        self.frequent_itemsets = list(frequent_itemsets)
+        self.N = self.support_index.n_transactions
+        self._extra_support = {}
+        self._item_index = None
+
+    def _build_support_index(self, itemsets):
+        """Count supports of itemsets and all their subsets, one pass over the transactions per itemset length"""
+        levels = defaultdict(set)
+        for itemset in itemsets:
+            levels[len(itemset)].add(tuple(sorted(itemset)))
+
+        for k in range(max(levels) if levels else 0, 1, -1):
+            for itemset in levels[k]:
+                levels[k - 1].update(itertools.combinations(itemset, k - 1))
+
+        support = defaultdict(int)
+        for k, level in levels.items():
+            a._count_candidates(level, self.transactions, k, support, self.weights)
 
-    def _ap_genrules(self, k_itemset, consequents):
+        return FrequentItemsetTable(dict((itemset, support[itemset]) for level in levels.values() for itemset in level),
+                                    a._total_weight(self.transactions, self.weights))
+
+    def support_count(self, itemset):
         """
-        :param frequent_k_itemsets:
-        :param consequents:
+        Get absolute support of itemset from the support index.
+
+        Itemsets missing from the index are derived from their supersets in a table of closed itemsets, otherwise
+        counted from the transactions once and cached. Without transactions, supersets in any other table only give a
+        lower bound, so ValueError is raised.
+        """
+        count = self.support_index.get(itemset)
+        if count is not None:
+            return count
+
+        key = frozenset(itemset)
+        if key not in self._extra_support:
+            if self.support_index.closed:
+                self._extra_support[key] = self.support_index.derive_support_count(itemset)
+            elif self.transactions is None:
+                raise ValueError('Transactions are needed to count supports of itemsets missing from a table of '
+                                 'non-closed itemsets')
+            else:
+                self._extra_support[key] = a.support_count(itemset, self.transactions, self.weights)
+
+        return self._extra_support[key]
+
+    def _ap_genrules(self, k_itemset, consequents, minconf, required=(), free_items=(), antecedent_items=None):
+        """
+        Generate rules from an itemset with consequents of one length, then recurse to longer consequents.
+
+        Confidence is anti-monotone in the consequent, so only consequents whose rules met minconf are merged into
+        longer consequents, and merged consequents with a failed subset are pruned before computing any measure.
+
+        :param k_itemset: frequent itemset
+        :param consequents: sorted list of sorted consequent tuples of equal length m, not including required items
+        :param minconf: minimum confidence
+        :param required: items included in every consequent
+        :param free_items: sorted items to extend the empty consequent () with
+        :param antecedent_items: items of which an antecedent must contain at least one, None for any
+        :return: generator of (antecedent, consequent, confidence) of rules meeting minconf
+
+        >>> ruler = RuleGenerator(['ABC', 'ABC', 'ABC', 'AB'], [('A', 'B', 'C')])
+        >>> [rule[:2] for rule in ruler._ap_genrules(('A', 'B', 'C'), [('A',), ('B',), ('C',)], 0.8)]
+        [(('B', 'C'), ('A',)), (('A', 'C'), ('B',)), (('C',), ('A', 'B'))]
+        >>> [rule[:2] for rule in ruler._ap_genrules(('A', 'B', 'C'), [()], 0.8, required=('A',), free_items='BC')]
+        [(('B', 'C'), ('A',)), (('C',), ('A', 'B'))]
         """
         k = len(k_itemset)
         m = len(consequents[0])
+        itemset_sup = self.support_count(k_itemset)
+
+        passed = []
+        for free in consequents:
+            consequent = tuple(sorted(free + required))
+            if antecedent_items is not None and antecedent_items <= set(consequent):
+                # Longer consequents would not leave an antecedent item either
+                continue
+
+            antecedent = tuple(item for item in k_itemset if item not in consequent)
+            ant_sup = self.support_count(antecedent)
+            conf = itemset_sup / float(ant_sup) if ant_sup else 0
+            if conf < minconf:
+                continue
+
+            passed.append(free)
+            yield antecedent, consequent, conf
+
+        if k <= m + len(required) + 1 or not passed:
+            return
+
+        if m == 0:
+            new_consequents = [(item,) for item in free_items]
+        else:
+            passed_set = set(passed)
+            new_consequents = [con for con in a._apriori_gen(passed)
+                               if all(subset in passed_set for subset in a.generate_transaction_subsets(con, m))]
+
+        if new_consequents:
+            for rule in self._ap_genrules(k_itemset, new_consequents, minconf, required, free_items, antecedent_items):
+                yield rule
+
+    def _get_item_index(self, itemsets):
+        """Get inverted index of item -> positions of itemsets containing it, cached for the frequent itemsets"""
+        if itemsets is self.frequent_itemsets and self._item_index is not None:
+            return self._item_index
+
+        item_index = defaultdict(list)
+        for position, itemset in enumerate(itemsets):
+            for item in itemset:
+                item_index[item].append(position)
+
+        if itemsets is self.frequent_itemsets:
+            self._item_index = item_index
+
+        return item_index
+
+    def itemsets_containing(self, items, itemsets=None):
+        """
+        Get itemsets that contain at least one of items, in their original order
+
+        >>> ruler = RuleGenerator(['ABC', 'AB', 'BC'], [('A',), ('B',), ('C',), ('A', 'B'), ('B', 'C')])
+        >>> ruler.itemsets_containing(['A', 'C'])
+        [('A',), ('C',), ('A', 'B'), ('B', 'C')]
+        """
+        sets = itemsets or self.frequent_itemsets
+        item_index = self._get_item_index(sets)
+
+        return [sets[position] for position in self._positions_containing(item_index, items)]
+
+    @staticmethod
+    def _positions_containing(item_index, items):
+        return sorted(set(position for item in items for position in item_index.get(item, ())))
+
+    def _select_itemsets(self, itemsets=None, fixed_consequents=(), fixed_antecedents=(), verbose=False):
+        """Get the itemsets that can give rules satisfying the item constraints, in their original order"""
+        sets = itemsets or self.frequent_itemsets
+
+        if fixed_consequents or fixed_antecedents:
+            # Only itemsets with a constrained item can give rules satisfying the constraints
+            item_index = self._get_item_index(sets)
+            positions = None
+            for constraint in (fixed_consequents, fixed_antecedents):
+                if constraint:
+                    selected = set(self._positions_containing(item_index, constraint))
+                    positions = selected if positions is None else positions & selected
+            sets = [sets[position] for position in sorted(positions)]
+
+            if verbose:
+                print('%s itemsets contain constrained items' % len(sets))
+
+        return [itemset for itemset in sets if len(itemset) > 1]
+
+    def _iter_rules(self, sets, minconf, maxconf=None, fixed_consequents=(), fixed_antecedents=(), verbose=False):
+        """Generate (antecedent, consequent) of rules from selected itemsets meeting the confidence and constraints"""
+        for i, itemset in enumerate(sets):
+            itemset = tuple(itemset)
+
+            antecedent_items = frozenset(fixed_antecedents).intersection(itemset) if fixed_antecedents else None
+
+            if fixed_consequents:
+                # Consequents containing each required item, but none of the required items before it
+                required_items = sorted(set(fixed_consequents).intersection(itemset))
+                generators = [self._ap_genrules(itemset, [()], minconf, required=(required,),
+                                                free_items=sorted(set(itemset) - set(required_items[:index + 1])),
+                                                antecedent_items=antecedent_items)
+                              for index, required in enumerate(required_items)]
+            else:
+                generators = [self._ap_genrules(itemset, sorted((item,) for item in itemset), minconf,
+                                                antecedent_items=antecedent_items)]
+
+            if verbose:
+                print('%s initial candidates for itemset %i of %i' % (len(itemset), i, len(sets)))
+
+            for antecedent, consequent, conf in itertools.chain(*generators):
+                if maxconf and conf > maxconf:
+                    continue
+                if verbose:
+                    print('found rule %s -> %s' % (antecedent, consequent))
 
-        if k > m + 1:
-            new_consequents = a._apriori_gen(consequents)
-            # TODO: Prune for better speed
-            #for new_con in new_consequents:
-            #    pass
+                yield antecedent, consequent
+
+    def _generate_rules(self, sets, *rule_args):
+        return [{(antecedent, consequent): self.get_rule_measurements(antecedent, consequent)}
+                for antecedent, consequent in self._iter_rules(sets, *rule_args)]
+
+    def _top_rules(self, rules, column, k, batch_size):
+        """
+        Keep the k best rules of a rule stream by a measure column
+
+        :return: list of rules, 2D array of their measures, array of their positions in the stream, stream length
+        """
+        best_rules = []
+        best_measures = np.zeros((0, len(MEASURES)))
+        best_order = np.zeros(0, dtype=np.int64)
+        seen = 0
+
+        while True:
+            batch = list(itertools.islice(rules, batch_size))
+            if not batch:
+                break
+
+            best_rules += batch
+            best_measures = np.vstack((best_measures, self.rule_measures(batch)))
+            best_order = np.concatenate((best_order, np.arange(seen, seen + len(batch))))
+            seen += len(batch)
+
+            keep = select_top(best_measures[:, column], best_order, k)
+            best_rules = [best_rules[i] for i in keep]
+            best_measures = best_measures[keep]
+            best_order = best_order[keep]
+
+        return best_rules, best_measures, best_order, seen
+
+    def _map_shards(self, function, sets, *args):
+        """Apply function to shards of itemsets in a process pool, returning the results in shard order"""
+        tasks = [(sets[start:end],) + args for start, end in shard_bounds(len(sets), NUM_CORES * _SHARDS_PER_CORE)]
+
+        pool = multiprocessing.Pool(NUM_CORES, initializer=_init_worker, initargs=(self,))
+        try:
+            return pool.map(function, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
 
     def confidence(self, antecedent, consequent):
-        ant_sup = a.support_count(antecedent, self.transactions)
+        ant_sup = self.support_count(antecedent)
         if ant_sup == 0:
             return 0
 
-        return a.support_count(list(set(antecedent) | set(consequent)), self.transactions) / float(ant_sup)
+        return self.support_count(set(antecedent) | set(consequent)) / float(ant_sup)
 
     def support(self, antecedent, consequent):
-        N = len(self.transactions)
+        N = self.N
         if N == 0:
             return 0
 
-        return a.support_count(list(set(antecedent) | set(consequent)), self.transactions) / float(N)
+        return self.support_count(set(antecedent) | set(consequent)) / float(N)
 
     def lift(self, antecedent, consequent):
-        sup = a.support_count(antecedent, self.transactions) * a.support_count(consequent, self.transactions)
+        sup = self.support_count(antecedent) * self.support_count(consequent)
         if sup == 0:
             return 0
 
         # return self.confidence(antecedent, consequent) / float(sup)
-        return self.N * a.support_count(list(set(antecedent) | set(consequent)), self.transactions) / float(sup)
+        return self.N * self.support_count(set(antecedent) | set(consequent)) / float(sup)
 
     def IS_measure(self, antecedent, consequent):
-        denominator = math.sqrt(a.get_support(antecedent, self.transactions) * a.get_support(consequent, self.transactions))
+        denominator = math.sqrt((self.support_count(antecedent) / float(self.N)) *
+                                (self.support_count(consequent) / float(self.N)))
         if denominator == 0:
             return 0
 
-        return a.get_support(list(set(antecedent) | set(consequent)), self.transactions) / denominator
+        return self.support_count(set(antecedent) | set(consequent)) / float(self.N) / denominator
 
     def get_rule_measurements(self, ant, con):
         return self.confidence(ant, con), self.support(ant, con), self.lift(ant, con), self.IS_measure(ant, con)
 
-    def rule_generation(self, minconf, itemsets=None, maxconf=None, fixed_consequents=(), verbose=False):
+    def rule_generation(self, minconf, itemsets=None, maxconf=None, fixed_consequents=(), fixed_antecedents=(),
+                        verbose=False):
         """
         Generate rules ({A, B} -> {C}) from frequent itemsets
+
+        With NUM_CORES > 1, shards of the itemsets are processed in a process pool and the rules are merged back in
+        the same order as generated by a single process.
+
+        :param minconf: minimum confidence
+        :param itemsets: itemsets to generate rules from, defaults to the frequent itemsets
+        :param maxconf: maximum confidence
+        :param fixed_consequents: items of which a consequent must contain at least one, empty for any
+        :param fixed_antecedents: items of which an antecedent must contain at least one, empty for any
+
+        >>> transactions = ['ABC', 'AB', 'BC', 'B']
+        >>> ruler = RuleGenerator(transactions, a.apriori(transactions, 'ABC', 0.5))
+        >>> ruler.rule_generation(0.6)
+        [{(('A',), ('B',)): (1.0, 0.5, 1.0, 0.7071067811865475)}, {(('C',), ('B',)): (1.0, 0.5, 1.0, 0.7071067811865475)}]
+        >>> ruler.rule_generation(0.4, maxconf=0.9, fixed_consequents=['C'])
+        [{(('B',), ('C',)): (0.5, 0.5, 1.0, 0.7071067811865475)}]
+        >>> ruler.rule_generation(0.6, fixed_antecedents=['C'])
+        [{(('C',), ('B',)): (1.0, 0.5, 1.0, 0.7071067811865475)}]
         """
-        rules = []
+        sets = self._select_itemsets(itemsets, fixed_consequents, fixed_antecedents, verbose)
+        rule_args = (minconf, maxconf, fixed_consequents, fixed_antecedents, verbose)
 
-        sets = itemsets or self.frequent_itemsets
+        if NUM_CORES > 1 and len(sets) > 1:
+            rules = list(itertools.chain(*self._map_shards(_generate_shard, sets, rule_args)))
+        else:
+            rules = self._generate_rules(sets, *rule_args)
 
-        for i, itemset in enumerate(sets):
-            candidates = [(item,) for item in itemset]
-            if verbose:
-                print('%s initial candidates for itemset %i of %i' % (len(candidates), i, len(sets)))
+        if verbose:
+            print('Found %i frequent rules' % (len(rules)))
 
-            while candidates:
-                good_candidates = []
-                for x in candidates:
-                    consequent = list(set(itemset) - set(x))
-                    conf = self.confidence(x, consequent)
+        return rules
 
-                    # TODO: Refactor structure (is minconf working?)
+    def rule_measures(self, rules):
+        """
+        Compute measures of a batch of rules in one vectorized step
+
+        :param rules: list of (antecedent, consequent)
+        :return: 2D array with a row of (confidence, support, lift, IS measure) for each rule
+
+        >>> transactions = ['ABC', 'AB', 'BC', 'B']
+        >>> ruler = RuleGenerator(transactions, a.apriori(transactions, 'ABC', 0.5))
+        >>> ruler.rule_measures([(('A',), ('B',)), (('B',), ('C',))]).tolist()
+        [[1.0, 0.5, 1.0, 0.7071067811865475], [0.5, 0.5, 1.0, 0.7071067811865475]]
+        """
+        union_sup = np.array([self.support_count(set(ant) | set(con)) for ant, con in rules], dtype=np.int64)
+        ant_sup = np.array([self.support_count(ant) for ant, _ in rules], dtype=np.int64)
+        con_sup = np.array([self.support_count(con) for _, con in rules], dtype=np.int64)
+
+        return rule_measures(union_sup, ant_sup, con_sup, self.N)
+
+    def top_rules(self, k, minconf, measure='lift', itemsets=None, maxconf=None, fixed_consequents=(),
+                  fixed_antecedents=(), batch_size=10000, verbose=False):
+        """
+        Generate the k best rules by a measure, computing measures in vectorized batches.
 
-                    if consequent and conf >= minconf and (not maxconf or conf <= maxconf):
-                        if (fixed_consequents and set(consequent) & set(fixed_consequents)) \
-                                or not fixed_consequents:
-                            rules.append({(x, tuple(consequent)): (conf,
-                                                                   self.support(x, consequent),
-                                                                   self.lift(x, consequent),
-                                                                   self.IS_measure(x, consequent))})
-                            if verbose:
-                                print('found rule %s -> %s' % (x, tuple(consequent)))
-                        good_candidates.append(x)
+        Only the best k rules are kept between batches, so memory is proportional to k + batch_size.
 
-                candidates = a._apriori_gen(good_candidates)
+        :param k: number of rules to return
+        :param minconf: minimum confidence
+        :param measure: one of MEASURES to rank rules by
+        :param batch_size: number of rules to compute measures for at once
+        :return: list of rules as returned by rule_generation, best first (ties in generation order)
+
+        >>> transactions = ['ABC', 'AB', 'BC', 'B', 'AC']
+        >>> ruler = RuleGenerator(transactions, a.apriori(transactions, 'ABC', 0.2))
+        >>> [list(rule.keys())[0] for rule in ruler.top_rules(2, 0.5, measure='lift')]
+        [(('C',), ('A',)), (('A',), ('C',))]
+        >>> ruler.top_rules(3, 0.5, measure='confidence', batch_size=2) == \\
+        ...     sorted(ruler.rule_generation(0.5), key=lambda rule: -list(rule.values())[0][0])[:3]
+        True
+        """
+        if measure not in MEASURES:
+            raise ValueError('Unknown measure %s, expected one of %s' % (measure, ', '.join(MEASURES)))
+        column = MEASURES.index(measure)
+
+        sets = self._select_itemsets(itemsets, fixed_consequents, fixed_antecedents, verbose)
+        rule_args = (minconf, maxconf, fixed_consequents, fixed_antecedents, verbose)
+
+        if NUM_CORES > 1 and len(sets) > 1:
+            # Merge the best rules of each shard, numbering rules in generation order over all shards
+            best_rules, best_measures, best_order = [], [np.zeros((0, len(MEASURES)))], []
+            seen = 0
+            for shard_rules, shard_measures, shard_order, shard_seen in \
+                    self._map_shards(_top_shard, sets, rule_args, column, k, batch_size):
+                best_rules += shard_rules
+                best_measures.append(shard_measures)
+                best_order.append(shard_order + seen)
+                seen += shard_seen
+
+            best_measures = np.vstack(best_measures)
+            best_order = np.concatenate(best_order)
+            keep = select_top(best_measures[:, column], best_order, k)
+            best_rules = [best_rules[i] for i in keep]
+            best_measures = best_measures[keep]
+            best_order = best_order[keep]
+        else:
+            best_rules, best_measures, best_order, seen = \
+                self._top_rules(self._iter_rules(sets, *rule_args), column, k, batch_size)
+
+        ranking = np.lexsort((best_order, -best_measures[:, column]))
 
         if verbose:
-            print('Found %i frequent rules' % (len(rules)))
+            print('Kept %i of %i rules' % (len(ranking), seen))
 
-        return rules
+        return [{best_rules[i]: tuple(best_measures[i].tolist())} for i in ranking]
+
+
+_worker_ruler = None
+
+
+def _init_worker(ruler):
+    """Keep the rule generator in a pool worker, for _generate_shard and _top_shard to look up supports with"""
+    global _worker_ruler
+    _worker_ruler = ruler
+
+
+def _generate_shard(args):
+    """Generate rules from a shard of itemsets"""
+    sets, rule_args = args
+    return _worker_ruler._generate_rules(sets, *rule_args)
+
+
+def _top_shard(args):
+    """Keep the best rules from a shard of itemsets"""
+    sets, rule_args, column, k, batch_size = args
+    return _worker_ruler._top_rules(_worker_ruler._iter_rules(sets, *rule_args), column, k, batch_size)
+
+
+def rule_measures(union_sup, ant_sup, con_sup, N):
+    """
+    Compute confidence, support, lift and IS measure from arrays of absolute supports
+
+    :param union_sup: supports of antecedent | consequent
+    :param ant_sup: supports of antecedents
+    :param con_sup: supports of consequents
+    :param N: number of transactions
+    :return: 2D array with a row of (confidence, support, lift, IS measure) for each rule
+
+    >>> rule_measures(np.array([2]), np.array([2]), np.array([4]), 4).tolist()
+    [[1.0, 0.5, 1.0, 0.7071067811865475]]
+    """
+    measures = np.zeros((len(union_sup), len(MEASURES)))
+    if not len(union_sup) or N == 0:
+        return measures
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        measures[:, 0] = np.where(ant_sup > 0, union_sup / ant_sup.astype(float), 0)
+        measures[:, 1] = union_sup / float(N)
+        measures[:, 2] = np.where(ant_sup * con_sup > 0, N * union_sup / (ant_sup * con_sup).astype(float), 0)
+        denominator = np.sqrt((ant_sup / float(N)) * (con_sup / float(N)))
+        measures[:, 3] = np.where(denominator > 0, measures[:, 1] / denominator, 0)
+
+    return measures
+
+
+def select_top(scores, order, k):
+    """
+    Get indices of the k highest scores, breaking ties at the boundary by lowest order
+
+    :param scores: array of scores of rules
+    :param order: array of positions of the rules, used to break ties
+    :param k: number of rules to select
+    :return: array of indices into scores, not sorted
+
+    >>> sorted(select_top(np.array([1.0, 3.0, 2.0, 3.0, 2.0]), np.arange(5), 3).tolist())
+    [1, 2, 3]
+    >>> select_top(np.array([1.0, 2.0, 3.0]), np.arange(3), 0).tolist()
+    []
+    """
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(scores) <= k:
+        return np.arange(len(scores))
 
+    threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)
+    ties = ties[np.argsort(order[ties], kind='mergesort')][:k - len(above)]
 
+    return np.concatenate((above, ties))
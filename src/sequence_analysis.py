@@ -8,30 +8,44 @@ import pandas as pd
 
 import apriori_sequential as asq
 import helpers
+from sequential_rules import SequentialRuleGenerator
 
 parser = argparse.ArgumentParser(description='Convert Halias RDF dataset for data mining')
 parser.add_argument('minsup', help='Minimum support', nargs='?', type=float, default=0.8)
 parser.add_argument('minconf', help='Minimum confidence', nargs='?', type=float, default=0.8)
+parser.add_argument('--engine', help='Frequent sequence mining engine', choices=asq.ENGINES, default='apriori')
+parser.add_argument('--cores', help='How many CPU cores to use for support counting', type=int, default=1)
+parser.add_argument('--min-gap', help='Minimum number of days between consecutive pattern elements', type=int,
+                    default=None)
+parser.add_argument('--max-gap', help='Maximum number of days between consecutive pattern elements', type=int,
+                    default=None)
+parser.add_argument('--window-size', help='Maximum number of days the events of a pattern element may span', type=int,
+                    default=None)
 args = parser.parse_args()
 
-NUM_CORES = 1
+asq.NUM_CORES = args.cores
 
 MINSUP = args.minsup
-MINCON = args.minsup
+MINCON = args.minconf
 
 
-year_seqs = helpers.get_yearly_sequences(prune_common_species=True)
+codec, year_seqs = helpers.get_encoded_yearly_sequences(prune_common_species=True, sparse=True)
 
 print('%s years' % len(year_seqs))
-a = set([spc for seq in year_seqs for day in seq for spc in day])
-print('%s taxa' % len(a))
+print('%s taxa' % len(codec))
 #print(sorted(a))
 
 #print(year_seqs[5][0])
 #print(year_seqs[0][0])
 #print(year_seqs[-5][180])
 
-freq_seqs = asq.apriori_sequential(year_seqs, MINSUP, verbose=True)
+freq_seqs = asq.apriori_sequential(year_seqs, MINSUP, verbose=True, engine=args.engine, min_gap=args.min_gap,
+                                   max_gap=args.max_gap, window_size=args.window_size)
 
-joblib.dump(freq_seqs, helpers.DATA_DIR + 'freq_seqs_{:.3f}.pkl'.format(MINSUP))
+joblib.dump(codec.decode_sequences(freq_seqs), helpers.DATA_DIR + 'freq_seqs_{:.3f}.pkl'.format(MINSUP))
+
+rules = SequentialRuleGenerator(freq_seqs).rule_generation(MINCON, verbose=True)
+
+joblib.dump(codec.decode_sequential_rules(rules),
+            helpers.DATA_DIR + 'seq_rules_{:.3f}_{:.3f}.pkl'.format(MINSUP, MINCON))
 
@@ -0,0 +1,108 @@
+"""Sequential rules (prefix => continuation) from frequent sequences."""
+
+import numpy as np
+
+from rules import MEASURES, rule_measures, select_top
+
+
+class SequentialRuleGenerator(object):
+    """
+    Generate sequential rules from frequent sequences. Splitting a frequent sequence between two of its elements gives
+    the rule prefix => continuation: sequences containing the prefix go on with the continuation.
+
+    The prefix and the continuation are contiguous subsequences of the frequent sequence, so they are frequent too (also
+    under gap and window constraints), and all measures are computed from the supports returned by the miner without
+    rescanning the sequences.
+
+    >>> import apriori_sequential as asq
+    >>> seqs = [((1, 2, 4), (2, 3), (5,)), ((1, 2), (2, 3, 4)), ((1, 2), (2, 3, 4), (2, 4, 5)), ((2,), (3, 4), (4, 5)),
+    ...         ((1, 3), (2, 4, 5))]
+    >>> ruler = SequentialRuleGenerator(asq.apriori_sequential(seqs, 0.8))
+    >>> ruler.rule_generation(0.9)
+    [{(((1,),), ((2,),)): (1.0, 0.8, 1.0, 0.894427190999916)}]
+    """
+
+    def __init__(self, frequent_sequences):
+        """
+        :param frequent_sequences: list of {sequence: support} as returned by apriori_sequential, with all levels
+                                   (not fixed_k) so that the supports of prefixes and continuations are known
+        """
+        self.sequences = [seq for freq_seq in frequent_sequences for seq in freq_seq]
+        self.support = dict(item for freq_seq in frequent_sequences for item in freq_seq.items())
+
+    def _splits(self):
+        """
+        Split every frequent sequence at each element boundary
+
+        :return: list of (prefix, continuation), 2D array of measures of the rules (see MEASURES)
+        """
+        splits = [(seq[:i], seq[i:]) for seq in self.sequences for i in range(1, len(seq))]
+
+        union_sup = np.array([self.support[prefix + continuation] for prefix, continuation in splits], dtype=float)
+        prefix_sup = np.array([self.support.get(prefix, 0) for prefix, _ in splits], dtype=float)
+        continuation_sup = np.array([self.support.get(continuation, 0) for _, continuation in splits], dtype=float)
+
+        # Supports are relative, so they are counts of a single transaction
+        return splits, rule_measures(union_sup, prefix_sup, continuation_sup, 1)
+
+    def _filter(self, measures, minconf, maxconf=None):
+        """Get indices of rules with confidence within limits"""
+        mask = measures[:, 0] >= minconf
+        if maxconf is not None:
+            mask &= measures[:, 0] <= maxconf
+
+        return np.flatnonzero(mask)
+
+    def rule_generation(self, minconf, maxconf=None, verbose=False):
+        """
+        Generate sequential rules, filtering all candidate rules by confidence in one vectorized step
+
+        :param minconf: minimum confidence
+        :param maxconf: maximum confidence
+        :return: list of {(prefix, continuation): (confidence, support, lift, IS measure)}, in the order of the
+                 frequent sequences
+
+        >>> ruler = SequentialRuleGenerator([{((1,),): 0.5}, {((2,),): 1.0}, {((1,), (2,)): 0.5, ((2,), (2,)): 0.25}])
+        >>> ruler.rule_generation(0.2, maxconf=0.9)
+        [{(((2,),), ((2,),)): (0.25, 0.25, 0.25, 0.25)}]
+        """
+        splits, measures = self._splits()
+        selected = self._filter(measures, minconf, maxconf)
+
+        rules = [{splits[i]: tuple(measures[i].tolist())} for i in selected]
+
+        if verbose:
+            print('Found %i sequential rules of %i candidates' % (len(rules), len(splits)))
+
+        return rules
+
+    def top_rules(self, k, minconf, measure='lift', maxconf=None, verbose=False):
+        """
+        Get the k best rules by a measure, best first (ties in the order of rule_generation)
+
+        >>> ruler = SequentialRuleGenerator([{((1,),): 0.5}, {((2,),): 1.0}, {((1,), (2,)): 0.5, ((2,), (2,)): 0.25}])
+        >>> ruler.top_rules(1, 0.1, measure='support')
+        [{(((1,),), ((2,),)): (1.0, 0.5, 1.0, 0.7071067811865475)}]
+        """
+        if measure not in MEASURES:
+            raise ValueError('Unknown measure %s, expected one of %s' % (measure, ', '.join(MEASURES)))
+
+        splits, measures = self._splits()
+        selected = self._filter(measures, minconf, maxconf)
+        scores = measures[selected, MEASURES.index(measure)]
+
+        keep = select_top(scores, selected, k)
+        best = selected[keep][np.lexsort((selected[keep], -scores[keep]))]
+
+        if verbose:
+            print('Selected %i of %i sequential rules' % (len(best), len(selected)))
+
+        return [{splits[i]: tuple(measures[i].tolist())} for i in best]
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
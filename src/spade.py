@@ -0,0 +1,140 @@
+"""Implementation of the SPADE algorithm, mining frequent sequences depth-first from vertical id-lists.
+
+Each sequence pattern has an id-list mapping sequence ids to the element indices where an occurrence of the pattern
+can end. Sequences are scanned once to build the id-lists of single events, longer patterns are counted by joining
+id-lists of two patterns sharing a prefix:
+
+- temporal join, P + (b) after P + a: positions of b after the first position of P + a
+- equality join, P + (a, b): positions where both P + a and P + b end
+"""
+
+from collections import defaultdict
+
+
+def _event_idlists(sequences):
+    """
+    Get id-lists of single events
+
+    >>> sorted((event, dict(idlist)) for event, idlist in _event_idlists([((1,), (), (1, 2)), ((2,),)]).items())
+    [(1, {0: [0, 2]}), (2, {0: [2], 1: [0]})]
+    """
+    idlists = defaultdict(lambda: defaultdict(list))
+    for sid, sequence in enumerate(sequences):
+        for eid, element in enumerate(sequence):
+            for event in set(element):
+                idlists[event][sid].append(eid)
+
+    return idlists
+
+
+def _temporal_join(first, second):
+    """Id-list of positions in second after the first position in first, per sequence"""
+    joined = {}
+    for sid, eids in first.items():
+        other_eids = second.get(sid)
+        if other_eids is None:
+            continue
+        later = [eid for eid in other_eids if eid > eids[0]]
+        if later:
+            joined[sid] = later
+
+    return joined
+
+
+def _equality_join(first, second):
+    """Id-list of positions in both first and second, per sequence"""
+    joined = {}
+    for sid, eids in first.items():
+        other_eids = second.get(sid)
+        if other_eids is None:
+            continue
+        common = sorted(set(eids).intersection(other_eids))
+        if common:
+            joined[sid] = common
+
+    return joined
+
+
+def _spade(members, min_count, max_k, support, weigh):
+    """
+    Extend an equivalence class of patterns sharing a prefix depth-first
+
+    :param members: list of (pattern, is_itemset_extension, last event, id-list, length)
+    :param min_count: minimum support count
+    :param max_k: maximum pattern length (number of events) or None
+    :param support: dict to store pattern supports in
+    :param weigh: function giving the support count of an id-list
+    """
+    for pattern, itemset_ext, event, idlist, length in members:
+        if max_k and length >= max_k:
+            continue
+
+        children = []
+        for other_pattern, other_itemset_ext, other_event, other_idlist, _ in members:
+            if other_itemset_ext:
+                if itemset_ext and other_event > event:
+                    candidates = [(pattern[:-1] + (pattern[-1] + (other_event,),), True, other_event,
+                                   _equality_join(idlist, other_idlist))]
+                else:
+                    candidates = []
+            else:
+                candidates = [(pattern + ((other_event,),), False, other_event, _temporal_join(idlist, other_idlist))]
+                if not itemset_ext and other_event > event:
+                    candidates.append((pattern[:-1] + (pattern[-1] + (other_event,),), True, other_event,
+                                       _equality_join(idlist, other_idlist)))
+
+            for child_pattern, child_itemset_ext, child_event, child_idlist in candidates:
+                count = weigh(child_idlist)
+                if count >= min_count:
+                    support[child_pattern] = count
+                    children.append((child_pattern, child_itemset_ext, child_event, child_idlist, length + 1))
+
+        if children:
+            _spade(children, min_count, max_k, support, weigh)
+
+
+def spade_support(sequences, minsup, fixed_k=None, verbose=False, weights=None):
+    """
+    Find frequent sequences and their support counts with SPADE
+
+    :param sequences: list of sequences containing elements containing events, or SparseSequences
+    :param minsup: minimum support
+    :param fixed_k: only mine sequences up to this length (number of events)
+    :param weights: multiplicities of sequences
+    :return: dict of frequent sequences (tuples of sorted tuples) -> support count
+
+    >>> seqs = [((1, 2), (3,)), ((1,), (3,), (2,)), ((1, 2),)]
+    >>> sorted(spade_support(seqs, 0.6).items())
+    [(((1,),), 3), (((1,), (3,)), 2), (((1, 2),), 2), (((2,),), 3), (((3,),), 2)]
+    """
+    if weights is None:
+        weigh = len
+        N = len(sequences)
+    else:
+        weigh = lambda idlist: sum(weights[sid] for sid in idlist)
+        N = sum(weights)
+    min_count = N * minsup
+
+    members = []
+    support = {}
+    for event, idlist in sorted(_event_idlists(sequences).items()):
+        count = weigh(idlist)
+        if count >= min_count:
+            pattern = ((event,),)
+            support[pattern] = count
+            members.append((pattern, False, event, dict(idlist), 1))
+
+    if verbose:
+        print('Initialized %s frequent 1-sequences' % len(members))
+
+    _spade(members, min_count, fixed_k, support, weigh)
+
+    return support
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
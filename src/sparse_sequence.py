@@ -0,0 +1,115 @@
+"""Compact storage for sequences with many empty elements, like daily observation sequences."""
+
+import numpy as np
+
+
+class SparseSequence(object):
+    """
+    Sequence stored as its non-empty elements only: positions (e.g. day offsets) of the elements in a day array and
+    their events in CSR form, events of element i being events[indptr[i]:indptr[i + 1]].
+
+    Iterating, indexing and len() go over the non-empty elements, so the sequential mining code runs on sparse
+    sequences as it runs on tuples of elements. Positions are used for gap and window constraints, see day_elements.
+
+    >>> seq = SparseSequence.from_elements([(), (1, 2), (), (), (3,), ()])
+    >>> len(seq), list(seq), seq[1], seq.days.tolist()
+    (2, [(1, 2), (3,)], (3,), [1, 4])
+    >>> list(day_elements(seq)) == list(day_elements(((), (1, 2), (), (), (3,))))
+    True
+    >>> seq.to_elements()
+    ((), (1, 2), (), (), (3,), ())
+    """
+
+    def __init__(self, days, indptr, events, length=None):
+        """
+        :param days: int array of positions of the non-empty elements, increasing
+        :param indptr: int array of offsets of elements in events, one longer than days
+        :param events: array of events of all elements
+        :param length: number of elements including empty ones, by default up to the last non-empty element
+        """
+        self.days = days
+        self.indptr = indptr
+        self.events = events
+        self.length = length if length is not None else (int(days[-1]) + 1 if len(days) else 0)
+
+    @classmethod
+    def from_elements(cls, sequence):
+        """Build a sparse sequence from a sequence of elements containing events"""
+        days = []
+        indptr = [0]
+        events = []
+        for day, element in enumerate(sequence):
+            if element:
+                days.append(day)
+                events.extend(element)
+                indptr.append(len(events))
+
+        return cls(np.array(days, dtype=np.int32), np.array(indptr, dtype=np.int32),
+                   np.array(events) if events else np.zeros(0, dtype=np.int32), length=len(sequence))
+
+    def to_elements(self):
+        """Get the sequence as a tuple of elements, with empty elements as ()"""
+        elements = [()] * self.length
+        for day, element in day_elements(self):
+            elements[day] = element
+
+        return tuple(elements)
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getitem__(self, index):
+        """
+        Get a non-empty element by index, or a tuple of them by slice
+
+        >>> seq = SparseSequence.from_elements([(1,), (), (2, 3), (4,)])
+        >>> seq[-1], seq[1:], seq[::-2]
+        ((4,), ((2, 3), (4,)), ((4,), (1,)))
+        """
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(len(self))[index])
+
+        index = range(len(self))[index]
+        return tuple(self.events[self.indptr[index]:self.indptr[index + 1]].tolist())
+
+    def __iter__(self):
+        events = self.events.tolist()
+        indptr = self.indptr.tolist()
+        for start, end in zip(indptr, indptr[1:]):
+            yield tuple(events[start:end])
+
+    def _key(self):
+        return self.length, self.days.tobytes(), self.indptr.tobytes(), tuple(self.events.tolist())
+
+    def __eq__(self, other):
+        return isinstance(other, SparseSequence) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return 'SparseSequence.from_elements(%r)' % (self.to_elements(),)
+
+
+def day_elements(sequence):
+    """
+    Get (position, element) of the non-empty elements of a sequence, either a SparseSequence or a sequence of elements
+
+    >>> list(day_elements(((2,), (), (1, 3))))
+    [(0, (2,)), (2, (1, 3))]
+    """
+    if isinstance(sequence, SparseSequence):
+        return zip(sequence.days.tolist(), sequence)
+
+    return ((day, element) for day, element in enumerate(sequence) if element)
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')
@@ -9,22 +9,30 @@ import apriori
 
 import apriori_sequential as asq
 import helpers
+from itemcodec import ItemCodec
 
 parser = argparse.ArgumentParser(description='Convert Halias RDF dataset for data mining')
 parser.add_argument('minsup', help='Minimum support', nargs='?', type=float, default=0.8)
+parser.add_argument('--engine', help='Frequent itemset mining engine', choices=apriori.ENGINES, default='apriori')
+parser.add_argument('--cores', help='How many CPU cores to use for support counting', type=int, default=1)
 #parser.add_argument('minconf', help='Minimum confidence', nargs='?', type=float, default=0.8)
 args = parser.parse_args()
 
-itemsets = helpers.get_species_itemsets()
-all_items = list(set([item for itemset in itemsets for item in itemset]))
+apriori.NUM_CORES = args.cores
+
+species_itemsets = helpers.get_species_itemsets()
+codec = ItemCodec.from_transactions(species_itemsets)
+itemsets, weights = apriori.deduplicate_transactions(codec.encode_transactions(species_itemsets))
+all_items = codec.all_ids()
 print(len(itemsets))
 print(len(all_items))
 
-freq_items = apriori.apriori(itemsets, all_items, args.minsup, verbose=True)
+freq_items = apriori.apriori(itemsets, all_items, args.minsup, verbose=True, engine=args.engine,
+                             weights=weights)
 
 print('\nSupport {:.3f} frequent itemsets:\n'.format(args.minsup))
 print(len(freq_items))
-print(freq_items[-1])
+print(codec.decode(freq_items[-1]))
 
-joblib.dump(freq_items, helpers.DATA_DIR + 'freq_species_itemsets_{:.3f}_NEW.pkl'.format(args.minsup))
+joblib.dump(codec.decode_itemsets(freq_items), helpers.DATA_DIR + 'freq_species_itemsets_{:.3f}_NEW.pkl'.format(args.minsup))
 
@@ -0,0 +1,235 @@
+"""Columnar storage of frequent itemsets and rules in uncompressed .npz files, loadable as memory-mapped arrays."""
+
+import struct
+import zipfile
+
+import numpy as np
+
+from frequent_itemsets import FrequentItemsetTable
+from rules import MEASURES, select_top
+
+
+def save_arrays(filename, arrays):
+    """Save a dict of arrays to an uncompressed .npz file, so that they can be memory-mapped by load_arrays"""
+    np.savez(filename, **arrays)
+
+
+def _memmap_member(filename, f, info):
+    """Memory-map an uncompressed .npy member of a zip file, None if it cannot be mapped"""
+    f.seek(info.header_offset)
+    name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+    f.seek(info.header_offset + 30 + name_length + extra_length)
+
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    else:
+        return None
+
+    if dtype.hasobject or not shape or not np.prod(shape):
+        return None
+
+    return np.memmap(filename, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def load_arrays(filename, mmap=True):
+    """
+    Load arrays from an .npz file, memory-mapping the arrays stored without compression
+
+    :param filename: .npz file
+    :param mmap: False to read all arrays into memory
+    :return: dict of array name -> array
+    """
+    arrays = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+
+            array = None
+            if mmap and info.compress_type == zipfile.ZIP_STORED:
+                array = _memmap_member(filename, f, info)
+            if array is None:
+                array = np.lib.format.read_array(archive.open(info))
+
+            arrays[name] = array
+
+    return arrays
+
+
+def save_itemsets(filename, table, vocabulary=None):
+    """
+    Save a FrequentItemsetTable in columnar form
+
+    :param filename: .npz file
+    :param table: FrequentItemsetTable
+    :param vocabulary: item names when the items of the table are integer ids into it (e.g. ItemCodec.items)
+
+    >>> import os, tempfile
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'itemsets.npz')
+    >>> save_itemsets(filename, FrequentItemsetTable({}, 0), vocabulary=['alli', 'tylli'])
+    >>> len(load_itemsets(filename))
+    0
+    """
+    arrays = table.to_arrays()
+    if vocabulary is not None:
+        arrays['vocabulary'] = np.asarray(vocabulary)[arrays['vocabulary']]
+
+    save_arrays(filename, arrays)
+
+
+def load_itemsets(filename):
+    return FrequentItemsetTable.from_arrays(**load_arrays(filename))
+
+
+class RuleStore(object):
+    """
+    Rules in columnar arrays: item vocabulary, CSR offsets and item indices of antecedents and consequents, and a float
+    array for each measure. Rules can be filtered and ranked by measures without creating Python objects for them.
+
+    >>> rules = [{(('varis',), ('peippo',)): (0.9, 0.5, 1.2, 0.7)}, {(('peippo',), ('varis',)): (0.6, 0.5, 1.2, 0.7)},
+    ...          {(('alli', 'varis'), ('peippo',)): (0.95, 0.2, 1.3, 0.5)}]
+    >>> store = RuleStore.from_rules(rules)
+    >>> store.select(confidence=(0.8, None), support=(0.3, None)).tolist()
+    [0]
+    >>> store.rules(store.top(2, 'lift')) == [rules[2], rules[0]]
+    True
+    >>> store.tuples([1])
+    [(('peippo',), ('varis',), 0.6, 0.5, 1.2, 0.7)]
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: dict of arrays as returned by to_arrays
+        """
+        self.arrays = arrays
+        self.vocabulary = arrays['vocabulary']
+
+    @classmethod
+    def from_rules(cls, rules, vocabulary=None):
+        """
+        Build a store from rules as returned by RuleGenerator.rule_generation
+
+        :param rules: list of {(antecedent, consequent): measures}
+        :param vocabulary: item names when the items of rules are integer ids into it (e.g. ItemCodec.items)
+        """
+        rules = [(antecedent, consequent, measures)
+                 for rule in rules for (antecedent, consequent), measures in rule.items()]
+
+        if vocabulary is None:
+            vocabulary = sorted(set(item for antecedent, consequent, _ in rules for item in antecedent + consequent))
+            item_ids = dict((item, item_id) for item_id, item in enumerate(vocabulary))
+        else:
+            item_ids = None
+
+        arrays = dict(vocabulary=np.asarray(vocabulary) if len(vocabulary) else np.zeros(0, dtype=np.int32))
+
+        for part, name in enumerate(('antecedent', 'consequent')):
+            offsets = np.zeros(len(rules) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(rule[part]) for rule in rules])
+            items = [item for rule in rules for item in rule[part]]
+            if item_ids is not None:
+                items = [item_ids[item] for item in items]
+
+            arrays[name + '_offsets'] = offsets
+            arrays[name + '_items'] = np.array(items, dtype=np.int32)
+
+        for column, measure in enumerate(MEASURES):
+            arrays[measure] = np.array([measures[column] for _, _, measures in rules], dtype=np.float64)
+
+        return cls(arrays)
+
+    def to_arrays(self):
+        return dict(self.arrays)
+
+    def save(self, filename):
+        """Save the rules to an uncompressed .npz file"""
+        save_arrays(filename, self.arrays)
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """
+        Load rules, memory-mapping the arrays unless mmap is False
+
+        >>> import os, tempfile
+        >>> filename = os.path.join(tempfile.mkdtemp(), 'rules.npz')
+        >>> RuleStore.from_rules([{(('A', 'B'), ('C',)): (0.9, 0.5, 1.2, 0.7)}]).save(filename)
+        >>> store = RuleStore.load(filename)
+        >>> store.rules(), type(store.arrays['lift']).__name__
+        ([{(('A', 'B'), ('C',)): (0.9, 0.5, 1.2, 0.7)}], 'memmap')
+        """
+        return cls(load_arrays(filename, mmap=mmap))
+
+    def __len__(self):
+        return len(self.arrays['antecedent_offsets']) - 1
+
+    def measure(self, measure):
+        """Get the array of a measure for all rules"""
+        if measure not in MEASURES:
+            raise ValueError('Unknown measure %s, expected one of %s' % (measure, ', '.join(MEASURES)))
+
+        return self.arrays[measure]
+
+    def select(self, indices=None, **bounds):
+        """
+        Get indices of rules with measures within bounds
+
+        :param indices: indices of rules to select from, all rules if None
+        :param bounds: measure=(minimum, maximum), with None for no limit
+        :return: sorted array of rule indices
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for measure, (minimum, maximum) in bounds.items():
+            values = self.measure(measure)
+            if minimum is not None:
+                mask &= values >= minimum
+            if maximum is not None:
+                mask &= values <= maximum
+
+        selected = np.flatnonzero(mask)
+        if indices is not None:
+            selected = np.intersect1d(selected, indices)
+
+        return selected
+
+    def top(self, k, measure, indices=None):
+        """
+        Get indices of the k best rules by a measure, best first (ties in stored order)
+
+        :param indices: indices of rules to select from, all rules if None
+        """
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices, dtype=np.int64)
+        scores = np.asarray(self.measure(measure)[indices])
+
+        keep = select_top(scores, indices, k)
+        return indices[keep][np.lexsort((indices[keep], -scores[keep]))]
+
+    def _items(self, part, index):
+        offsets = self.arrays[part + '_offsets']
+        item_ids = self.arrays[part + '_items'][offsets[index]:offsets[index + 1]]
+        return tuple(self.vocabulary[item_ids].tolist())
+
+    def rule(self, index):
+        """Get (antecedent, consequent), measures of a rule"""
+        return ((self._items('antecedent', index), self._items('consequent', index)),
+                tuple(float(self.arrays[measure][index]) for measure in MEASURES))
+
+    def rules(self, indices=None):
+        """Get rules in the format of RuleGenerator.rule_generation, all rules if indices is None"""
+        indices = range(len(self)) if indices is None else indices
+        return [dict([self.rule(index)]) for index in indices]
+
+    def tuples(self, indices=None):
+        """Get rules as (antecedent, consequent, confidence, support, lift, IS measure), see helpers.rules_to_tuples"""
+        indices = range(len(self)) if indices is None else indices
+        return [rule + measures for rule, measures in (self.rule(index) for index in indices)]
+
+
+if __name__ == "__main__":
+    print('Running doctests')
+    import doctest
+    res = doctest.testmod()
+    if not res[0]:
+        print('OK!')